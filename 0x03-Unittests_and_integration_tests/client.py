@@ -1,30 +1,185 @@
 #!/usr/bin/env python3
 """A github org client
 """
+import threading
+from bisect import bisect_left
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from operator import attrgetter
 from typing import (
+    Any,
     List,
     Dict,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
 )
 
+from query import Where, run_query, top_k
+from repo_store import RepoStore, write_repo_store
+from repo_table import RepoTable
+from snapshot import Snapshot, write_snapshot
+
 from utils import (
+    PRIORITY_LOW,
+    LRUCache,
     get_json,
-    access_nested_map,
+    get_json_async,
+    iter_json_items,
+    iter_json_pages,
+    iter_json_pages_async,
+    request_priority,
+    async_memoize,
+    compile_path,
+    extract_columns,
+    invalidate_memoized,
     memoize,
+    update_memoized,
+    with_query,
 )
 
+LICENSE_PATH = ("license", "key")
+PUBLIC_REPOS_FIELDS = ("name", "license.key")
+_license_key = compile_path(LICENSE_PATH)
 
-class GithubOrgClient:
-    """A Githib org client
+
+def _license_of(repo: Dict) -> Optional[str]:
+    """License key of a repo, None when it has none"""
+    try:
+        return _license_key(repo)
+    except KeyError:
+        return None
+
+
+class RepoList(list):
+    """List of repo records carrying the structures derived from it
+
+    Indexes and sync state built by `GithubOrgClient` live in
+    ``derived``, so every client sharing the list (see the ``cache``
+    argument) shares them as well. A published list is never changed:
+    `GithubOrgClient.sync_repos` makes a new one.
+    """
+
+    def __init__(self, repos: Iterable[Dict] = (),
+                 derived: Optional[Dict] = None) -> None:
+        """Wrap ``repos`` with already ``derived`` structures"""
+        super().__init__(repos)
+        self.derived = {} if derived is None else derived
+
+
+class _BaseGithubOrgClient:
+    """Logic shared by the blocking and asyncio org clients
     """
     ORG_URL = "https://api.github.com/orgs/{org}"
 
     def __init__(self, org_name: str) -> None:
-        """Init method of GithubOrgClient"""
+        """Init method of the org clients"""
         self._org_name = org_name
 
-    @memoize
+    @classmethod
+    def _repo_names(
+        cls,
+        repos: Iterable[Dict],
+        license: str = None,
+    ) -> List[str]:
+        """Names of the repos, optionally filtered by license"""
+        return [
+            repo["name"] for repo in repos
+            if license is None or cls.has_license(repo, license)
+        ]
+
+    @staticmethod
+    def has_license(repo: Dict[str, Dict], license_key: str) -> bool:
+        """Static: has_license"""
+        assert license_key is not None, "license_key cannot be None"
+        try:
+            has_license = _license_key(repo) == license_key
+        except KeyError:
+            return False
+        return has_license
+
+
+class GithubOrgClient(_BaseGithubOrgClient):
+    """A Githib org client
+    """
+    memo_backend: Optional[LRUCache] = None
+    INDEXED_FIELDS = ("license.key", "language")
+
+    def __init__(
+        self,
+        org_name: str,
+        stream: bool = False,
+        page_workers: int = 1,
+        ttl: Optional[float] = None,
+        columnar: bool = False,
+        table_fields: Sequence[str] = (),
+        cache: Optional[LRUCache] = None,
+        incremental: bool = False,
+        snapshot: Optional[Snapshot] = None,
+        store: Optional[RepoStore] = None,
+    ) -> None:
+        """Init method of GithubOrgClient
+
+        With ``stream`` set, `public_repos` filters repos page by page as
+        they arrive instead of going through the memoized payload.
+        ``page_workers`` bounds how many repos pages are fetched at once.
+        ``ttl`` makes `org` and `repos_payload` expire after that many
+        seconds; they are then refreshed in the background.
+        With ``columnar`` set, `public_repos` runs on `repos_table`, which
+        keeps only the name, license key and ``table_fields`` of each repo.
+        ``cache`` (e.g. ``utils.shared_memo_cache``) shares the memoized
+        values with every client built with the same arguments; setting
+        ``GithubOrgClient.memo_backend`` does so for all clients.
+        With ``incremental`` set, refreshing an expired `repos_payload`
+        only merges the repos changed since (see `sync_repos`).
+        A ``snapshot`` holding this org provides the first `org` and
+        `repos_payload` values instead of the API (see `load_snapshot`).
+        A ``store`` holding this org answers `public_repos` from its
+        shared memory-mapped file (see `publish_repo_store`).
+        """
+        super().__init__(org_name)
+        self._stream = stream
+        self._page_workers = page_workers
+        self._ttl = ttl
+        self._columnar = columnar
+        self._table_fields = tuple(table_fields)
+        self._incremental = incremental
+        self._sync_lock = threading.Lock()
+        self._snapshot = snapshot
+        self._store = store
+        self._restored = set()
+        if cache is not None:
+            self.memo_backend = cache
+
+    def _memo_key(self) -> tuple:
+        """Constructor arguments keying the shared memoized values"""
+        return (self._org_name, self._stream, self._page_workers,
+                self._ttl, self._columnar, self._table_fields,
+                self._incremental)
+
+    def _restorable(self, field: str) -> bool:
+        """Whether ``field`` is still to be read from the snapshot"""
+        snapshot = self._snapshot
+        return snapshot is not None and field not in self._restored and \
+            self._org_name in snapshot
+
+    def _restore(self, field: str):
+        """``field`` read from the snapshot, once; None without one"""
+        if not self._restorable(field):
+            return None
+        self._restored.add(field)
+        return getattr(self._snapshot, field)(self._org_name)
+
+    @memoize(ttl=attrgetter("_ttl"))
     def org(self) -> Dict:
         """Memoize org"""
+        org = self._restore("org")
+        if org is not None:
+            return org
         return get_json(self.ORG_URL.format(org=self._org_name))
 
     @property
@@ -32,27 +187,487 @@ class GithubOrgClient:
         """Public repos URL"""
         return self.org["repos_url"]
 
-    @memoize
-    def repos_payload(self) -> Dict:
-        """Memoize repos payload"""
-        return get_json(self._public_repos_url)
+    @memoize(ttl=attrgetter("_ttl"))
+    def repos_payload(self) -> List[Dict]:
+        """Memoize repos payload (every page)"""
+        if self._incremental and hasattr(self, "_repos_payload"):
+            return self._sync()[0]
+        repos = self._restore("repos")
+        if repos is not None:
+            return RepoList(repos)
+        return RepoList(
+            repo
+            for page in self._iter_repos_pages()
+            for repo in page
+        )
+
+    def dump_snapshot(self, path: str) -> None:
+        """Write `org` and `repos_payload` to a snapshot file at ``path``
+
+        Fetches them first if needed; see `dump_snapshots` for many orgs.
+        """
+        dump_snapshots([self], path)
+
+    @classmethod
+    def load_snapshot(
+        cls,
+        path: str,
+        org_name: Optional[str] = None,
+        **kwargs,
+    ) -> "GithubOrgClient":
+        """Client for ``org_name`` warmed from a snapshot file
+
+        ``org_name`` may be omitted for a single-org snapshot; other
+        arguments go to the constructor. Nothing is decoded until `org`
+        or `repos_payload` is first read.
+        """
+        snapshot = Snapshot(path)
+        if org_name is None:
+            if len(snapshot) != 1:
+                snapshot.close()
+                raise ValueError("org_name is required for a snapshot "
+                                 "of {} orgs".format(len(snapshot)))
+            org_name = next(iter(snapshot))
+        return cls(org_name, snapshot=snapshot, **kwargs)
+
+    def iter_repos(self) -> Iterator[Dict]:
+        """Stream repos, fetching the next page only when it is needed"""
+        return self._iter_repos()
+
+    def _iter_repos(self, fields: Sequence[str] = None) -> Iterator[Dict]:
+        """Stream repos, decoding only ``fields`` unless already fetched
+
+        Repos are decoded straight off the socket one by one, unless pages
+        are prefetched concurrently, in which case they come page by page.
+        """
+        if hasattr(self, "_repos_payload") or self._restorable("repos"):
+            yield from self.repos_payload
+        elif self._page_workers > 1:
+            for page in self._iter_repos_pages(fields):
+                yield from page
+        else:
+            yield from iter_json_items(self._public_repos_url, fields)
+
+    @memoize(ttl=attrgetter("_ttl"))
+    def repos_table(self) -> RepoTable:
+        """Memoize repos as a columnar table, streamed page by page"""
+        fields = RepoTable.REQUIRED_FIELDS + self._table_fields
+        return RepoTable.from_records(self._iter_repos(fields), fields)
+
+    def _iter_repos_pages(
+        self,
+        fields: Sequence[str] = None,
+    ) -> Iterator[List[Dict]]:
+        """Repos pages, in order"""
+        return iter_json_pages(self._public_repos_url,
+                               max_workers=self._page_workers,
+                               projection=fields)
+
+    def _derived(self, payload: List[Dict]) -> Dict:
+        """Structures derived from ``payload``, shared with its holders"""
+        derived = getattr(payload, "derived", None)
+        if derived is None:
+            cached = getattr(self, "_derived_state", None)
+            if cached is None or cached[0] is not payload:
+                cached = (payload, {})
+                self._derived_state = cached
+            derived = cached[1]
+        return derived
+
+    def _license_state(self, payload: List[Dict]) -> tuple:
+        """Positions and names by license key of ``payload``'s repos"""
+        derived = self._derived(payload)
+        state = derived.get("license")
+        if state is None:
+            names, keys = extract_columns(payload,
+                                          [("name",), LICENSE_PATH])
+            positions: Dict[str, List[int]] = {}
+            index: Dict[str, List[str]] = {}
+            for position, (name, key) in enumerate(zip(names, keys)):
+                if key is not None:
+                    positions.setdefault(key, []).append(position)
+                    index.setdefault(key, []).append(name)
+            state = derived["license"] = (positions, index)
+        return state
+
+    @property
+    def license_index(self) -> Dict[str, List[str]]:
+        """Repo names by license key, built from the current repos_payload
+
+        The index is kept along with the payload it was built from, so a
+        refreshed or invalidated payload gets a new one, and `sync_repos`
+        hands a patched copy to the payload it makes.
+        """
+        return self._license_state(self.repos_payload)[1]
+
+    def field_index(self, field: str) -> Optional[Dict[Any, List[int]]]:
+        """Positions in repos_payload by value of ``field``
+
+        Only `INDEXED_FIELDS` are indexed (None for other fields); each
+        index is built on first use and kept with the payload like
+        `license_index`. Repos missing the field are left out.
+        """
+        return self._field_index(self.repos_payload, field)
+
+    def _field_index(
+        self,
+        payload: List[Dict],
+        field: str,
+    ) -> Optional[Dict[Any, List[int]]]:
+        """Positions in ``payload`` by value of ``field``"""
+        if field == "license.key":
+            return self._license_state(payload)[0]
+        if field not in self.INDEXED_FIELDS:
+            return None
+        derived = self._derived(payload)
+        index = derived.get(("field", field))
+        if index is None:
+            index = {}
+            values, = extract_columns(payload, [field.split(".")])
+            for position, value in enumerate(values):
+                if value is not None:
+                    index.setdefault(value, []).append(position)
+            derived[("field", field)] = index
+        return index
+
+    def query(
+        self,
+        where: Where = None,
+        order_by: Union[str, Sequence[str], None] = None,
+        limit: Optional[int] = None,
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Any]:
+        """Repos matching every condition of ``where``, in one pass
+
+        Conditions map dotted fields to a value, an (operator, operand)
+        tuple or a predicate, e.g. ``{"fork": False, "forks": (">", 10),
+        "language": "Python"}``; an equality on an indexed field narrows
+        the pass to that field's repos. Results are sorted on
+        ``order_by`` ("-field" for descending), cut to ``limit`` and
+        reduced to ``fields`` if given. See `query.run_query`.
+        """
+        payload = self.repos_payload
+        return run_query(payload, where, order_by, limit, fields,
+                         partial(self._field_index, payload))
+
+    def top_repos(
+        self,
+        k: int,
+        order_by: Union[str, Sequence[str]],
+        where: Where = None,
+        fields: Sequence[str] = ("name",),
+    ) -> List[Dict]:
+        """First ``k`` repos in ``order_by`` order, as dicts of ``fields``
+
+        Repos are streamed page by page (or read from repos_payload when
+        it is already loaded), decoding only the fields the query needs,
+        and only ``k`` of them are held at a time: O(n log k).
+        """
+        order = (order_by,) if isinstance(order_by, str) else order_by
+        needed = tuple(dict.fromkeys(
+            tuple(fields) + tuple(where or ()) +
+            tuple(field.lstrip("-") for field in order)))
+        return top_k(self._iter_repos(needed), k, order, where, fields)
+
+    def most_forked(self, k: int = 20) -> List[str]:
+        """Names of the ``k`` most forked repos"""
+        return [repo["name"] for repo in self.top_repos(k, "-forks")]
+
+    def recently_updated(self, k: int = 20) -> List[str]:
+        """Names of the ``k`` most recently updated repos"""
+        return [repo["name"] for repo in self.top_repos(k, "-updated_at")]
+
+    @staticmethod
+    def _repo_id(repo: Dict):
+        """Identity of a repo across fetches"""
+        return repo.get("id", repo.get("name"))
+
+    def sync_repos(self) -> List[Dict]:
+        """Merge the repos changed since the last fetch into repos_payload
+
+        Repos are read most recently updated first and only until one
+        older than the newest known ``updated_at`` shows up, so the cost
+        follows the number of changed repos rather than the org size.
+        The merged payload is a new list, stored like a refreshed value
+        (and so shared through the ``cache``); the one other threads or
+        clients may be reading is left untouched. Changed repos keep
+        their position, new ones are appended, the license index is
+        patched and `repos_table` dropped. Deleted repos go unnoticed
+        until `repos_payload` is invalidated.
+        Returns the merged repos; loads the payload if it was not yet.
+        """
+        if not hasattr(self, "_repos_payload"):
+            self.repos_payload
+            return []
+        return self._sync()[1]
+
+    def _sync(self) -> Tuple[List[Dict], List[Dict]]:
+        """Store repos_payload merged with the changed repos, then drop
+        `repos_table`, so no table built in between outlives the merge
+
+        Returns the merged payload and the changed repos.
+        """
+        with self._sync_lock:
+            payload, merged = self._merge_changes(self.repos_payload)
+            if merged:
+                update_memoized(self, "repos_payload", payload)
+        if merged:
+            invalidate_memoized(self, "repos_table")
+        return payload, merged
+
+    def _merge_changes(
+        self,
+        payload: List[Dict],
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """``payload`` with the repos changed since merged, and those repos
+
+        Returns ``payload`` itself when nothing changed.
+        """
+        derived = self._derived(payload)
+        sync = derived.get("sync")
+        if sync is None:
+            sync = derived["sync"] = (
+                {self._repo_id(repo): position
+                 for position, repo in enumerate(payload)},
+                max((repo.get("updated_at") or "" for repo in payload),
+                    default=""),
+            )
+        ids, synced_at = sync
+        url = with_query(self._public_repos_url,
+                         sort="updated", direction="desc")
+        changed = []
+        for repo in iter_json_items(url):
+            if (repo.get("updated_at") or "") < synced_at:
+                break
+            changed.append(repo)
+        merged = []
+        for repo in reversed(changed):
+            position = ids.get(self._repo_id(repo))
+            if position is None or payload[position] != repo:
+                merged.append(repo)
+        if not merged:
+            return payload, merged
+        repos = list(payload)
+        ids = dict(ids)
+        license_state = derived.get("license")
+        if license_state is not None:
+            license_state = (dict(license_state[0]), dict(license_state[1]))
+        copied = set()
+        for repo in merged:
+            key = self._repo_id(repo)
+            position = ids.get(key)
+            if position is None:
+                previous = None
+                ids[key] = position = len(repos)
+                repos.append(repo)
+            else:
+                previous = repos[position]
+                repos[position] = repo
+            if license_state is not None:
+                self._move_license(license_state, copied, position,
+                                   previous, repo)
+            synced_at = max(synced_at, repo.get("updated_at") or "")
+        new_derived = {"sync": (ids, synced_at)}
+        if license_state is not None:
+            new_derived["license"] = license_state
+        return RepoList(repos, new_derived), merged
+
+    @staticmethod
+    def _move_license(
+        license_state: tuple,
+        copied: set,
+        position: int,
+        previous: Optional[Dict],
+        repo: Dict,
+    ) -> None:
+        """Update the license index for the repo stored at ``position``
+
+        ``license_state`` holds copies of the dicts of a published index;
+        each bucket is copied (and added to ``copied``) before its first
+        change.
+        """
+        positions, index = license_state
+
+        def bucket(key):
+            """Writable slots and names of ``key``"""
+            if key not in copied:
+                copied.add(key)
+                positions[key] = list(positions.get(key, ()))
+                index[key] = list(index.get(key, ()))
+            return positions[key], index[key]
+
+        if previous is not None:
+            key = _license_of(previous)
+            if key is not None:
+                slots, names = bucket(key)
+                slot = bisect_left(slots, position)
+                del slots[slot]
+                del names[slot]
+                if not slots:
+                    del positions[key], index[key]
+                    copied.discard(key)
+        key = _license_of(repo)
+        if key is not None:
+            slots, names = bucket(key)
+            slot = bisect_left(slots, position)
+            slots.insert(slot, position)
+            names.insert(slot, repo["name"])
 
     def public_repos(self, license: str = None) -> List[str]:
         """Public repos"""
-        json_payload = self.repos_payload
-        public_repos = [
-            repo["name"] for repo in json_payload
-            if license is None or self.has_license(repo, license)
+        store = self._store
+        if store is not None:
+            names = store.names(self._org_name, license)
+            if names is not None:
+                return names
+        if self._columnar:
+            table = self.repos_table
+            if license is None:
+                return list(table.column("name"))
+            return table.take("name", table.positions("license.key",
+                                                      license))
+        if self._stream:
+            return self._repo_names(self._iter_repos(PUBLIC_REPOS_FIELDS),
+                                    license)
+        if license is None:
+            return self._repo_names(self.repos_payload)
+        return list(self.license_index.get(license, ()))
+
+
+def dump_snapshots(clients: Iterable[GithubOrgClient], path: str) -> int:
+    """Write the state of many org clients to one snapshot file
+
+    Returns the number of orgs written.
+    """
+    return write_snapshot(path, (
+        (client._org_name, client.org, list(client.repos_payload))
+        for client in clients
+    ))
+
+
+def publish_repo_store(clients: Iterable[GithubOrgClient], path: str) -> int:
+    """Write the repos of many org clients to a `RepoStore` file
+
+    The file replaces ``path`` atomically; stores open on it switch over
+    on their next check. Returns the number of orgs written.
+    """
+    return write_repo_store(path, (
+        (client._org_name, client.repos_payload) for client in clients
+    ))
+
+
+def load_snapshots(path: str, **kwargs) -> Dict[str, GithubOrgClient]:
+    """Clients for every org of a snapshot file, sharing one mapping
+
+    Each org is decoded only when its client is first read; ``kwargs``
+    go to every `GithubOrgClient`.
+    """
+    snapshot = Snapshot(path)
+    return {
+        org_name: GithubOrgClient(org_name, snapshot=snapshot, **kwargs)
+        for org_name in snapshot
+    }
+
+
+class AsyncGithubOrgClient(_BaseGithubOrgClient):
+    """An asyncio Github org client
+
+    Same API as `GithubOrgClient`, with awaitable methods instead of
+    properties, so many orgs can be served from one event loop.
+    """
+
+    @async_memoize
+    async def org(self) -> Dict:
+        """Memoize org"""
+        return await get_json_async(self.ORG_URL.format(org=self._org_name))
+
+    async def _public_repos_url(self) -> str:
+        """Public repos URL"""
+        return (await self.org())["repos_url"]
+
+    @async_memoize
+    async def repos_payload(self) -> List[Dict]:
+        """Memoize repos payload (every page)"""
+        url = await self._public_repos_url()
+        return [
+            repo
+            async for page in iter_json_pages_async(url)
+            for repo in page
         ]
 
-        return public_repos
+    async def public_repos(self, license: str = None) -> List[str]:
+        """Public repos"""
+        return self._repo_names(await self.repos_payload(), license)
 
-    @staticmethod
-    def has_license(repo: Dict[str, Dict], license_key: str) -> bool:
-        """Static: has_license"""
-        assert license_key is not None, "license_key cannot be None"
+
+class OrgResult(NamedTuple):
+    """Outcome of one org in a batch: its repo names or the error"""
+    org: str
+    repos: Optional[List[str]]
+    error: Optional[Exception]
+
+
+class BatchResult(NamedTuple):
+    """Repo names of every org that succeeded, errors of the others"""
+    repos: Dict[str, List[str]]
+    errors: Dict[str, Exception]
+
+
+class GithubOrgBatchClient:
+    """Public repos of many orgs at once
+
+    Each org's `org` and `repos_payload` fetches run on a shared pool of
+    ``max_workers`` threads, which caps the number of orgs in flight.
+    A failing org is reported in the result instead of stopping the batch.
+    Requests are sent at ``priority``, low by default so interactive
+    lookups get ahead of the sweep under the rate limiter.
+    """
+
+    def __init__(
+        self,
+        org_names: Iterable[str],
+        max_workers: int = 16,
+        priority: int = PRIORITY_LOW,
+    ) -> None:
+        """Init method of GithubOrgBatchClient"""
+        self._org_names = list(dict.fromkeys(org_names))
+        self._max_workers = max_workers
+        self._priority = priority
+
+    def _public_repos(self, org_name: str, license: str = None) -> List[str]:
+        """Public repos of a single org"""
+        with request_priority(self._priority):
+            return GithubOrgClient(org_name, stream=True) \
+                .public_repos(license)
+
+    def iter_public_repos(self, license: str = None) -> Iterator[OrgResult]:
+        """Yield each org's result as soon as it is done"""
+        executor = ThreadPoolExecutor(max_workers=self._max_workers)
         try:
-            has_license = access_nested_map(repo, ("license", "key")) == license_key
-        except KeyError:
-            return False
-        return has_license
\ No newline at end of file
+            futures = {
+                executor.submit(self._public_repos, org_name, license):
+                    org_name
+                for org_name in self._org_names
+            }
+            for future in as_completed(futures):
+                try:
+                    repos = future.result()
+                except Exception as error:
+                    yield OrgResult(futures[future], None, error)
+                else:
+                    yield OrgResult(futures[future], repos, None)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def public_repos(self, license: str = None) -> BatchResult:
+        """Mapping of org name to public repos, in input order"""
+        done = {result.org: result for result in
+                self.iter_public_repos(license)}
+        repos, errors = {}, {}
+        for org_name in self._org_names:
+            result = done[org_name]
+            if result.error is None:
+                repos[org_name] = result.repos
+            else:
+                errors[org_name] = result.error
+        return BatchResult(repos, errors)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Single-pass queries over lists of repo records.
+"""
+import heapq
+import operator
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Union,
+)
+
+from utils import compile_path
+
+__all__ = [
+    "OPERATORS",
+    "QueryPlan",
+    "plan_query",
+    "run_query",
+    "top_k",
+]
+
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda value, operand: value in operand,
+}
+_ORDERED = frozenset(("<", "<=", ">", ">="))
+
+# A condition is a value to compare for equality, an (operator, operand)
+# tuple or a predicate called with the field value.
+Condition = Union[Any, tuple, Callable[[Any], bool]]
+Where = Optional[Mapping[str, Condition]]
+IndexLookup = Callable[[str], Optional[Mapping[Hashable, Sequence[int]]]]
+
+
+class QueryPlan(NamedTuple):
+    """How a query reads its records: the positions taken from an index
+    (None to scan every record) and the predicate checking the rest.
+    """
+    positions: Optional[Sequence[int]]
+    predicate: Callable[[Mapping], bool]
+    index_field: Optional[str] = None
+
+
+def _getter(field: str) -> Callable[[Mapping], Any]:
+    """Value of a dotted ``field`` of a record, None when missing."""
+    access = compile_path(tuple(field.split(".")))
+
+    def get(record: Mapping) -> Any:
+        """Value of ``field`` in ``record``."""
+        try:
+            return access(record)
+        except KeyError:
+            return None
+
+    return get
+
+
+def _check(condition: Condition) -> Callable[[Any], bool]:
+    """Function telling whether a field value meets ``condition``."""
+    if callable(condition):
+        return condition
+    if not isinstance(condition, tuple):
+        return lambda value: value == condition
+    try:
+        name, operand = condition
+        compare = OPERATORS[name]
+    except (KeyError, ValueError):
+        raise ValueError(
+            "invalid condition {!r}".format(condition)) from None
+    if name in _ORDERED:
+        return lambda value: value is not None and compare(value, operand)
+    return lambda value: compare(value, operand)
+
+
+def _equality_operand(condition: Condition) -> Any:
+    """Operand of an equality condition, None for any other condition."""
+    if isinstance(condition, tuple):
+        if len(condition) == 2 and condition[0] == "==":
+            return condition[1]
+        return None
+    return None if callable(condition) else condition
+
+
+def plan_query(where: Where, index: IndexLookup = None) -> QueryPlan:
+    """Plan ``where`` into one pass over the records.
+    Of the equality conditions on fields ``index`` has an index for, the
+    one matching the fewest records supplies the candidate positions;
+    every other condition is folded into a single predicate.
+    Parameters
+    ----------
+    where: Mapping
+        dotted field name to condition (value, (operator, operand) or
+        predicate of the value); all conditions must hold
+    index: Callable
+        returns the positions by value of a field, or None if the field
+        is not indexed
+    Example
+    -------
+    >>> plan = plan_query({"language": "Python", "forks": (">", 10)},
+    ...                   client.field_index)
+    >>> plan.index_field
+    'language'
+    """
+    where = dict(where or {})
+    best = None
+    if index is not None:
+        for field, condition in where.items():
+            operand = _equality_operand(condition)
+            if operand is None:
+                continue
+            positions = index(field)
+            if positions is None:
+                continue
+            try:
+                positions = positions.get(operand, ())
+            except TypeError:
+                continue
+            if best is None or len(positions) < len(best[1]):
+                best = (field, positions)
+    if best is not None:
+        del where[best[0]]
+    checks = [(_getter(field), _check(condition))
+              for field, condition in where.items()]
+
+    def predicate(record: Mapping) -> bool:
+        """Whether ``record`` meets every remaining condition."""
+        for get, check in checks:
+            if not check(get(record)):
+                return False
+        return True
+
+    if best is None:
+        return QueryPlan(None, predicate)
+    return QueryPlan(best[1], predicate, best[0])
+
+
+class _Descending:
+    """Sort key wrapper inverting the order of ``key``."""
+    __slots__ = ("key",)
+
+    def __init__(self, key: Any) -> None:
+        """Wrap ``key``."""
+        self.key = key
+
+    def __lt__(self, other: "_Descending") -> bool:
+        """Whether ``other`` wraps the smaller key."""
+        return other.key < self.key
+
+    def __eq__(self, other: object) -> bool:
+        """Whether ``other`` wraps an equal key."""
+        return isinstance(other, _Descending) and self.key == other.key
+
+
+def _sort_key(
+    order_by: Union[str, Sequence[str]],
+) -> Callable[[Mapping], tuple]:
+    """Key ordering records by fields, "-field" for descending.
+    Missing values go last in either direction.
+    """
+    if isinstance(order_by, str):
+        order_by = (order_by,)
+    parts = []
+    for field in order_by:
+        descending = field.startswith("-")
+        parts.append((_getter(field[1:] if descending else field),
+                      descending))
+
+    def key(record: Mapping) -> tuple:
+        """Sort key of ``record``."""
+        values = []
+        for get, descending in parts:
+            value = get(record)
+            if descending:
+                values.append(_Descending((value is not None, value)))
+            else:
+                values.append((value is None, value))
+        return tuple(values)
+
+    return key
+
+
+def run_query(
+    records: Iterable[Mapping],
+    where: Where = None,
+    order_by: Union[str, Sequence[str], None] = None,
+    limit: Optional[int] = None,
+    fields: Optional[Sequence[str]] = None,
+    index: IndexLookup = None,
+) -> List[Any]:
+    """Filter, sort, cut and project ``records`` in a single pass.
+    Parameters
+    ----------
+    records: Iterable
+        repo records, possibly streamed; ``index`` positions refer to
+        this sequence and need it to be one
+    where: Mapping
+        conditions, see `plan_query`
+    order_by: str or Sequence
+        fields to sort on, prefixed with "-" for descending order;
+        records keep their order otherwise
+    limit: int
+        maximum number of results; with ``order_by`` they are kept in a
+        heap of ``limit`` records, O(n log limit), instead of sorting
+        every match
+    fields: Sequence
+        dotted fields kept in each result, as a flat dict; whole records
+        are returned when omitted
+    index: Callable
+        index lookup, see `plan_query`
+    Example
+    -------
+    >>> run_query(repos, {"fork": False, "forks": (">=", 100)},
+    ...           order_by="-forks", fields=["name", "forks"])
+    [{'name': 'traceur-compiler', 'forks': 604},
+     {'name': 'ios-webkit-debug-proxy', 'forks': 395}]
+    """
+    plan = plan_query(where, index)
+    candidates = records if plan.positions is None \
+        else (records[position] for position in plan.positions)
+    predicate = plan.predicate
+    if order_by is None and limit is not None:
+        matches = []
+        if limit > 0:
+            for record in candidates:
+                if predicate(record):
+                    matches.append(record)
+                    if len(matches) == limit:
+                        break
+    elif order_by is None:
+        matches = [record for record in candidates if predicate(record)]
+    elif limit is None:
+        matches = sorted(filter(predicate, candidates),
+                         key=_sort_key(order_by))
+    else:
+        matches = heapq.nsmallest(max(limit, 0),
+                                  filter(predicate, candidates),
+                                  key=_sort_key(order_by))
+    if fields is None:
+        return matches
+    getters = [(field, _getter(field)) for field in fields]
+    return [{field: get(record) for field, get in getters}
+            for record in matches]
+
+
+def top_k(
+    records: Iterable[Mapping],
+    k: int,
+    order_by: Union[str, Sequence[str]],
+    where: Where = None,
+    fields: Optional[Sequence[str]] = None,
+) -> List[Any]:
+    """The first ``k`` records in ``order_by`` order, read in one pass.
+    Only ``k`` records are held at any time, so ``records`` can be a
+    stream of any length; ties keep their original order.
+    Example
+    -------
+    >>> top_k(client.iter_repos(), 2, "-forks", fields=["name"])
+    [{'name': 'dagger'}, {'name': 'traceur-compiler'}]
+    """
+    return run_query(records, where, order_by, k, fields)
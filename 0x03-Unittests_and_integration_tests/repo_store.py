@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""Memory-mapped repo store shared by worker processes.
+"""
+import json
+import os
+import mmap
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from utils import compile_path, decode_json
+
+__all__ = [
+    "REPO_STORE_VERSION",
+    "RepoStore",
+    "write_repo_store",
+]
+
+REPO_STORE_VERSION = 1
+
+_HEADER = struct.Struct("<4sB3xQQ")
+_MAGIC = b"GHRS"
+_ALIGN = 8
+_license_key = compile_path(("license", "key"))
+
+
+def _license_of(repo: Mapping) -> Optional[str]:
+    """License key of a repo, None when it has none."""
+    try:
+        return _license_key(repo)
+    except KeyError:
+        return None
+
+
+class _Writer:
+    """Append aligned sections to a file, tracking their offsets."""
+
+    def __init__(self, out: Any) -> None:
+        """Reserve the header at the start of ``out``."""
+        self._out = out
+        self.offset = _HEADER.size
+        out.write(b"\0" * _HEADER.size)
+
+    def section(self, data: bytes) -> int:
+        """Write ``data`` at the next aligned offset and return it."""
+        padding = -self.offset % _ALIGN
+        self._out.write(b"\0" * padding)
+        offset = self.offset + padding
+        self._out.write(data)
+        self.offset = offset + len(data)
+        return offset
+
+    def column(self, values: Iterable[bytes]) -> Tuple[int, int]:
+        """Write end offsets then the concatenated ``values``."""
+        ends = array("Q")
+        blob = bytearray()
+        for value in values:
+            blob += value
+            ends.append(len(blob))
+        return self.section(ends.tobytes()), self.section(bytes(blob))
+
+
+def write_repo_store(
+    path: str,
+    orgs: Iterable[Tuple[str, Sequence[Mapping]]],
+) -> int:
+    """Write the repos of each ``(org_name, repos)`` pair to a store file.
+    Per org the file holds the repo names and the JSON encoded repos as
+    offset-indexed columns, plus the row positions of each license key;
+    an index of those offsets closes the file. It is written to a
+    temporary name and renamed over ``path``, so a `RepoStore` open on
+    the old file keeps reading it until it picks up the new one. Returns
+    the number of orgs written.
+    Example
+    -------
+    >>> write_repo_store("repos.store", [("google", repos)])
+    1
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            writer = _Writer(out)
+            index = {}
+            for org_name, repos in orgs:
+                positions: Dict[str, array] = {}
+                for position, repo in enumerate(repos):
+                    key = _license_of(repo)
+                    if key is not None:
+                        positions.setdefault(key, array("Q")).append(
+                            position)
+                name_ends, names = writer.column(
+                    repo["name"].encode("utf-8") for repo in repos)
+                record_ends, records = writer.column(
+                    json.dumps(repo, separators=(",", ":")).encode("utf-8")
+                    for repo in repos)
+                index[org_name] = {
+                    "count": len(repos),
+                    "names": [name_ends, names],
+                    "records": [record_ends, records],
+                    "licenses": {
+                        key: [writer.section(slots.tobytes()), len(slots)]
+                        for key, slots in positions.items()
+                    },
+                }
+            index_offset = writer.section(json.dumps(index).encode("utf-8"))
+            out.seek(0)
+            out.write(_HEADER.pack(_MAGIC, REPO_STORE_VERSION,
+                                   index_offset, writer.offset))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(index)
+
+
+class _Mapping:
+    """One mapped store file with its decoded index."""
+
+    def __init__(self, path: str) -> None:
+        """Map ``path`` and decode its index."""
+        with open(path, "rb") as store_file:
+            self.stat = os.fstat(store_file.fileno())
+            self.map = mmap.mmap(store_file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+        try:
+            self.index = self._read_index()
+        except BaseException:
+            self.map.close()
+            raise
+        self.view = memoryview(self.map)
+
+    def _read_index(self) -> Dict[str, Dict]:
+        """Check the header and decode the index."""
+        if len(self.map) < _HEADER.size:
+            raise ValueError("not a repo store file")
+        magic, version, index_offset, end = _HEADER.unpack_from(self.map)
+        if magic != _MAGIC or version != REPO_STORE_VERSION:
+            raise ValueError("unsupported repo store format")
+        if end != len(self.map):
+            raise ValueError("truncated repo store file")
+        return decode_json(self.map[index_offset:end])
+
+    def integers(self, offset: int, count: int) -> memoryview:
+        """``count`` unsigned 64-bit integers at ``offset``, not copied."""
+        return self.view[offset:offset + 8 * count].cast("Q")
+
+    def column(self, org: Dict, name: str) -> Tuple[memoryview, int]:
+        """End offsets and data offset of one column of ``org``."""
+        ends_offset, data_offset = org[name]
+        return self.integers(ends_offset, org["count"]), data_offset
+
+    def cell(self, org: Dict, name: str, position: int) -> bytes:
+        """Bytes of row ``position`` of one column of ``org``."""
+        ends, data = self.column(org, name)
+        start = ends[position - 1] if position else 0
+        return self.map[data + start:data + ends[position]]
+
+    def same_file(self, stat: os.stat_result) -> bool:
+        """Whether ``stat`` describes the mapped file."""
+        return (stat.st_ino, stat.st_dev, stat.st_mtime_ns) == \
+            (self.stat.st_ino, self.stat.st_dev, self.stat.st_mtime_ns)
+
+
+class RepoStore:
+    """Read-only view of a file made by `write_repo_store`.
+    The file is memory-mapped, so every process opening it shares the
+    same physical pages. Lookups read straight from the mapping: the
+    names asked for are decoded, everything else stays on disk. When the
+    file at ``path`` is replaced, the store switches to the new file on
+    its next lookup at least ``check_interval`` seconds after the last
+    check; readers still holding the old file are not disturbed.
+    Example
+    -------
+    >>> store = RepoStore("repos.store")
+    >>> store.names("google", license="apache-2.0")
+    ['dagger', 'kratu', 'traceur-compiler', 'firmata.py']
+    """
+
+    def __init__(self, path: str, check_interval: float = 1.0) -> None:
+        """Map the store at ``path``."""
+        self.path = path
+        self.check_interval = check_interval
+        self._mapping = _Mapping(path)
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def refresh(self) -> bool:
+        """Switch to the file now at ``path`` if it was replaced."""
+        self._checked = time.monotonic()
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        if self._mapping.same_file(stat):
+            return False
+        with self._lock:
+            if not self._mapping.same_file(stat):
+                self._mapping = _Mapping(self.path)
+        return True
+
+    def _current(self) -> _Mapping:
+        """The mapping to read from, refreshed when due."""
+        if time.monotonic() - self._checked >= self.check_interval:
+            self.refresh()
+        return self._mapping
+
+    def __contains__(self, org_name: str) -> bool:
+        """Whether the store holds ``org_name``"""
+        return org_name in self._current().index
+
+    def __iter__(self) -> Iterator[str]:
+        """Org names, in the order they were written"""
+        return iter(self._current().index)
+
+    def __len__(self) -> int:
+        """Number of orgs"""
+        return len(self._current().index)
+
+    def count(self, org_name: str) -> int:
+        """Number of repos of ``org_name``"""
+        return self._current().index[org_name]["count"]
+
+    def names(self, org_name: str,
+              license: str = None) -> Optional[List[str]]:
+        """Repo names of ``org_name``, optionally only those under
+        ``license``, in stored order; None if the store lacks the org.
+        """
+        mapping = self._current()
+        org = mapping.index.get(org_name)
+        if org is None:
+            return None
+        ends, data = mapping.column(org, "names")
+        view = mapping.view
+        if license is None:
+            positions = range(org["count"])
+        else:
+            offset, count = org["licenses"].get(license, (0, 0))
+            positions = mapping.integers(offset, count) if count else ()
+        names = []
+        for position in positions:
+            start = ends[position - 1] if position else 0
+            names.append(str(view[data + start:data + ends[position]],
+                             "utf-8"))
+        return names
+
+    def repo(self, org_name: str, position: int) -> Dict:
+        """Decode the repo stored at ``position`` for ``org_name``"""
+        mapping = self._current()
+        org = mapping.index[org_name]
+        if not 0 <= position < org["count"]:
+            raise IndexError(position)
+        return decode_json(mapping.cell(org, "records", position))
+
+    def repos(self, org_name: str) -> Iterator[Dict]:
+        """Decode the repos of ``org_name`` one by one"""
+        mapping = self._current()
+        org = mapping.index[org_name]
+        for position in range(org["count"]):
+            yield decode_json(mapping.cell(org, "records", position))
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Compact column-oriented storage for repos payloads.
+"""
+import sys
+from array import array
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Sequence,
+)
+
+from utils import extract_columns
+
+__all__ = [
+    "RepoTable",
+]
+
+
+def _compact(values: List[Any]) -> Sequence:
+    """Store a column in the smallest form that keeps its values.
+    Booleans go to a byte array, integers to a 64-bit array and strings
+    (possibly with None) to a list of interned strings; anything else is
+    kept as a list.
+    """
+    kinds = {type(value) for value in values}
+    if kinds == {bool}:
+        return array("b", values)
+    if kinds == {int}:
+        try:
+            return array("q", values)
+        except OverflowError:
+            return values
+    if kinds <= {str, type(None)}:
+        return [value if value is None else sys.intern(value)
+                for value in values]
+    return values
+
+
+class RepoTable:
+    """Read-only table holding selected fields of a list of repos.
+    Fields are dotted key paths into the repo records ("name",
+    "license.key", "owner.login"); only those fields are kept, one
+    column each, and every other key of the payload is dropped. Boolean
+    columns read back as 0/1.
+    Example
+    -------
+    >>> table = RepoTable.from_records(repos, ["forks"])
+    >>> table.fields
+    ('name', 'license.key', 'forks')
+    >>> table.take("name", table.positions("license.key", "mit"))
+    ['kratu']
+    """
+    REQUIRED_FIELDS = ("name", "license.key")
+
+    def __init__(self, columns: Mapping[str, Sequence], length: int) -> None:
+        """Wrap already built columns of ``length`` rows each."""
+        self._columns = dict(columns)
+        self._length = length
+        self._indexes: Dict[str, Dict[Hashable, List[int]]] = {}
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Iterable[Mapping],
+        fields: Sequence[str] = (),
+    ) -> "RepoTable":
+        """Build a table from repo records, consuming them once
+
+        ``name`` and ``license.key`` are always kept; missing values are
+        stored as None.
+        """
+        fields = tuple(dict.fromkeys(cls.REQUIRED_FIELDS + tuple(fields)))
+        values = extract_columns(records,
+                                 [field.split(".") for field in fields])
+        return cls(
+            {field: _compact(column)
+             for field, column in zip(fields, values)},
+            len(values[0]),
+        )
+
+    def __len__(self) -> int:
+        """Number of repos"""
+        return self._length
+
+    @property
+    def fields(self) -> tuple:
+        """Names of the stored fields, in order"""
+        return tuple(self._columns)
+
+    def column(self, field: str) -> Sequence:
+        """Stored column of ``field`` (not a copy)"""
+        try:
+            return self._columns[field]
+        except KeyError:
+            raise KeyError(field) from None
+
+    def index(self, field: str) -> Dict[Hashable, List[int]]:
+        """Row positions by value of ``field``, built on first use"""
+        index = self._indexes.get(field)
+        if index is None:
+            index = {}
+            for position, value in enumerate(self.column(field)):
+                index.setdefault(value, []).append(position)
+            self._indexes[field] = index
+        return index
+
+    def positions(self, field: str, value: Hashable) -> List[int]:
+        """Positions of the rows whose ``field`` equals ``value``"""
+        return self.index(field).get(value, [])
+
+    def take(self, field: str, positions: Iterable[int]) -> List[Any]:
+        """Values of ``field`` at ``positions``"""
+        column = self.column(field)
+        return [column[position] for position in positions]
+
+    def rows(self, fields: Sequence[str] = None) -> Iterator[Dict[str, Any]]:
+        """Yield each repo as a flat dict of field to value"""
+        fields = self.fields if fields is None else tuple(fields)
+        columns = [self.column(field) for field in fields]
+        for values in zip(*columns):
+            yield dict(zip(fields, values))
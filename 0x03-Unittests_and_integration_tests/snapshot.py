@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Binary snapshots of org client state, for warm starts.
+"""
+import marshal
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Tuple,
+)
+
+__all__ = [
+    "SNAPSHOT_VERSION",
+    "Snapshot",
+    "write_snapshot",
+]
+
+SNAPSHOT_VERSION = 1
+
+_HEADER = struct.Struct("<4sBBBxIQ")
+_MAGIC = b"GHSN"
+
+
+def write_snapshot(
+    path: str,
+    entries: Iterable[Tuple[str, Dict, List[Dict]]],
+) -> int:
+    """Write ``(org_name, org, repos)`` entries to a snapshot file.
+    The file is a fixed header, then each org and repos list as a
+    separate `marshal` blob, then an index of blob offsets by org name.
+    It is written to a temporary name and renamed into place, so readers
+    never see a partial snapshot. Returns the number of orgs written.
+    Example
+    -------
+    >>> write_snapshot("orgs.snap", [("google", org, repos)])
+    1
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(b"\0" * _HEADER.size)
+            offset = _HEADER.size
+            index: Dict[str, Tuple[int, int, int, int]] = {}
+            for org_name, org, repos in entries:
+                spans = []
+                for value in (org, repos):
+                    blob = marshal.dumps(value)
+                    tmp_file.write(blob)
+                    spans += [offset, len(blob)]
+                    offset += len(blob)
+                index[org_name] = tuple(spans)
+            tmp_file.write(marshal.dumps(index))
+            tmp_file.seek(0)
+            tmp_file.write(_HEADER.pack(_MAGIC, SNAPSHOT_VERSION,
+                                        *sys.version_info[:2],
+                                        len(index), offset))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(index)
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of a file made by `write_snapshot`.
+    Only the header and the index are decoded when the file is opened;
+    each org and repos list is decoded from the mapping when asked for,
+    so opening a snapshot of thousands of orgs is cheap and untouched
+    orgs cost no memory beyond their pages in the OS cache.
+    Example
+    -------
+    >>> with Snapshot("orgs.snap") as snapshot:
+    ...     snapshot.org("google")["repos_url"]
+    'https://api.github.com/orgs/google/repos'
+    """
+
+    def __init__(self, path: str) -> None:
+        """Map ``path`` and read its index.
+
+        Raises ValueError if the file is not a snapshot of this version
+        written by this Python version (`marshal` data is not portable).
+        """
+        with open(path, "rb") as snapshot_file:
+            self._map = mmap.mmap(snapshot_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        try:
+            self._index = self._read_index()
+        except BaseException:
+            self._map.close()
+            raise
+        self.path = path
+
+    def _read_index(self) -> Dict[str, Tuple[int, int, int, int]]:
+        """Check the header and decode the index"""
+        if len(self._map) < _HEADER.size:
+            raise ValueError("not a snapshot file")
+        magic, version, major, minor, count, offset = \
+            _HEADER.unpack_from(self._map)
+        if magic != _MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("unsupported snapshot format")
+        if (major, minor) != sys.version_info[:2]:
+            raise ValueError(
+                "snapshot written by Python {}.{}".format(major, minor))
+        with memoryview(self._map)[offset:] as blob:
+            index = marshal.loads(blob)
+        if len(index) != count:
+            raise ValueError("corrupt snapshot index")
+        return index
+
+    def __len__(self) -> int:
+        """Number of orgs"""
+        return len(self._index)
+
+    def __contains__(self, org_name: str) -> bool:
+        """Whether the snapshot holds ``org_name``"""
+        return org_name in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        """Org names, in the order they were written"""
+        return iter(self._index)
+
+    def _load(self, offset: int, length: int) -> Any:
+        """Decode one blob straight from the mapping"""
+        with memoryview(self._map)[offset:offset + length] as blob:
+            return marshal.loads(blob)
+
+    def org(self, org_name: str) -> Dict:
+        """Org payload of ``org_name``"""
+        offset, length, _, _ = self._index[org_name]
+        return self._load(offset, length)
+
+    def repos(self, org_name: str) -> List[Dict]:
+        """Repos payload of ``org_name``"""
+        _, _, offset, length = self._index[org_name]
+        return self._load(offset, length)
+
+    def close(self) -> None:
+        """Unmap the file"""
+        self._map.close()
+
+    def __enter__(self) -> "Snapshot":
+        """Use the snapshot as a context manager"""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Unmap the file on leaving the context"""
+        self.close()
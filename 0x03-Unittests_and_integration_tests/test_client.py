@@ -9,13 +9,21 @@ including:
 - `public_repos()`: Returns a list of public repositories.
 - `has_license()`: Checks if a repository has a specific license.
 
+`AsyncGithubOrgClient`, the asyncio flavour of the client, is covered the
+same way with awaitable mocks.
+
 Tests are performed using mocks and patches to simulate API responses and
 validate the behavior of the class.
 """
 
+import asyncio
+import json
+import threading
+import time
 import unittest
 from typing import Dict
 from unittest.mock import (
+    AsyncMock,
     MagicMock,
     Mock,
     PropertyMock,
@@ -24,8 +32,13 @@ from unittest.mock import (
 from parameterized import parameterized, parameterized_class
 from requests import HTTPError
 
-from client import GithubOrgClient
+from client import (
+    AsyncGithubOrgClient,
+    GithubOrgBatchClient,
+    GithubOrgClient,
+)
 from fixtures import TEST_PAYLOAD
+from utils import LRUCache, extract_columns, invalidate_memoized
 
 
 class TestGithubOrgClient(unittest.TestCase):
@@ -86,18 +99,19 @@ class TestGithubOrgClient(unittest.TestCase):
                 "https://api.github.com/users/google/repos"
             )
 
-    @patch("client.get_json")
-    def test_public_repos(self, mock_get_json: MagicMock) -> None:
+    @patch("client.iter_json_pages")
+    def test_public_repos(self, mock_iter_pages: MagicMock) -> None:
         """
         Test the `public_repos` method of `GithubOrgClient`.
 
         Args:
-            mock_get_json (MagicMock): The mocked `get_json` function.
+            mock_iter_pages (MagicMock): The mocked `iter_json_pages`
+                function.
 
         Asserts:
             - The `public_repos` method returns a list of repository names.
-            - The `_public_repos_url` property and `get_json` function
-                are called exactly once.
+            - The `_public_repos_url` property and `iter_json_pages`
+                function are called exactly once.
         """
         test_payload = {
             'repos_url': "https://api.github.com/users/google/repos",
@@ -116,14 +130,72 @@ class TestGithubOrgClient(unittest.TestCase):
                  "forks": 32, "default_branch": "master"},
             ]
         }
-        mock_get_json.return_value = test_payload['repos']
+        mock_iter_pages.return_value = iter([test_payload['repos']])
         with patch("client.GithubOrgClient._public_repos_url",
                    new_callable=PropertyMock) as mock_public_repos_url:
             mock_public_repos_url.return_value = test_payload['repos_url']
             client = GithubOrgClient("google")
             self.assertEqual(client.public_repos(), ["episodes.dart", "kratu"])
             mock_public_repos_url.assert_called_once()
-        mock_get_json.assert_called_once()
+        mock_iter_pages.assert_called_once_with(
+            test_payload['repos_url'], max_workers=1, projection=None
+        )
+
+    @patch("client.iter_json_items")
+    def test_public_repos_streams_repos(
+        self,
+        mock_iter_items: MagicMock
+    ) -> None:
+        """
+        Test that streaming `public_repos` consumes repos one by one.
+
+        Asserts:
+            - Repos are filtered and returned in order.
+            - Only the name and license fields are requested.
+            - `iter_repos` does not decode the second repo until the
+              first one has been consumed.
+        """
+        decoded = []
+
+        def items(url, projection):
+            for repo in (
+                {"name": "a", "license": {"key": "mit"}},
+                {"name": "b"},
+                {"name": "c", "license": {"key": "mit"}},
+            ):
+                decoded.append(projection)
+                yield repo
+
+        mock_iter_items.side_effect = items
+        with patch("client.GithubOrgClient._public_repos_url",
+                   new_callable=PropertyMock) as mock_public_repos_url:
+            mock_public_repos_url.return_value = "repos"
+            client = GithubOrgClient("google", stream=True)
+            self.assertEqual(client.public_repos(license="mit"), ["a", "c"])
+            self.assertFalse(hasattr(client, "_repos_payload"))
+
+            repos = client.iter_repos()
+            self.assertEqual(next(repos)["name"], "a")
+            self.assertEqual(decoded, [("name", "license.key")] * 3 + [None])
+
+    @patch("client.iter_json_pages")
+    def test_public_repos_prefetched_pages(
+        self,
+        mock_iter_pages: MagicMock
+    ) -> None:
+        """
+        Test that streaming with `page_workers` goes page by page.
+        """
+        mock_iter_pages.return_value = iter([[{"name": "a"}],
+                                             [{"name": "b"}]])
+        with patch("client.GithubOrgClient._public_repos_url",
+                   new_callable=PropertyMock) as mock_public_repos_url:
+            mock_public_repos_url.return_value = "repos"
+            client = GithubOrgClient("google", stream=True, page_workers=4)
+            self.assertEqual(client.public_repos(), ["a", "b"])
+        mock_iter_pages.assert_called_once_with(
+            "repos", max_workers=4, projection=("name", "license.key")
+        )
 
     @parameterized.expand([
         ({'license': {'key': "bsd-3-clause"}}, "bsd-3-clause", True),
@@ -146,6 +218,340 @@ class TestGithubOrgClient(unittest.TestCase):
         client = GithubOrgClient("google")
         self.assertEqual(client.has_license(repo, key), expected)
 
+    @patch("client.iter_json_pages")
+    def test_public_repos_uses_license_index(
+        self,
+        mock_iter_pages: MagicMock
+    ) -> None:
+        """
+        Test that license filters after the first are index lookups.
+
+        Asserts:
+            - Filtered results match a scan of the payload.
+            - Only the first filtered call walks the repos.
+            - The index is rebuilt when `repos_payload` is invalidated.
+        """
+        repos = TEST_PAYLOAD[0][1]
+        bsd_repos = [repo["name"] for repo in repos
+                     if GithubOrgClient.has_license(repo, "bsd-3-clause")]
+        mock_iter_pages.side_effect = [iter([repos]), iter([repos[:1]])]
+        with patch("client.GithubOrgClient._public_repos_url",
+                   new_callable=PropertyMock) as mock_public_repos_url, \
+                patch("client.extract_columns",
+                      wraps=extract_columns) as mock_extract:
+            mock_public_repos_url.return_value = "repos"
+            client = GithubOrgClient("google")
+            self.assertEqual(client.public_repos(license="apache-2.0"),
+                             TEST_PAYLOAD[0][3])
+            mock_extract.assert_called_once()
+            self.assertEqual(client.public_repos(license="bsd-3-clause"),
+                             bsd_repos)
+            self.assertEqual(client.public_repos(license="unknown"), [])
+            mock_extract.reset_mock()
+            client.public_repos(license="apache-2.0")
+            mock_extract.assert_not_called()
+
+            invalidate_memoized(client, "repos_payload")
+            self.assertEqual(client.public_repos(license="apache-2.0"), [])
+
+    @patch("client.get_json")
+    def test_org_expires(self, mock_get_json: MagicMock) -> None:
+        """
+        Test that `ttl` and `invalidate_memoized` refresh the org.
+
+        Asserts:
+            - An expired org is still served while it is re-fetched.
+            - An invalidated org is fetched again on the next read.
+        """
+        mock_get_json.side_effect = [{"v": 1}, {"v": 2}, {"v": 3}]
+        client = GithubOrgClient("google", ttl=0)
+        self.assertEqual(client.org, {"v": 1})
+        self.assertEqual(client.org, {"v": 1})
+        for _ in range(100):
+            if not client._org_refreshing:
+                break
+            time.sleep(0.01)
+        self.assertEqual(mock_get_json.call_count, 2)
+        invalidate_memoized(client, "org")
+        self.assertEqual(client.org, {"v": 3})
+
+    @staticmethod
+    def make_repo(repo_id: int, updated_at: str, license: str = None,
+                  name: str = None) -> Dict:
+        """Minimal repo record"""
+        return {
+            "id": repo_id,
+            "name": name or "repo{}".format(repo_id),
+            "license": license and {"key": license},
+            "updated_at": updated_at,
+        }
+
+    @patch("client.iter_json_items")
+    @patch("client.iter_json_pages")
+    def test_sync_repos(
+        self,
+        mock_iter_pages: MagicMock,
+        mock_iter_items: MagicMock,
+    ) -> None:
+        """
+        Test that `sync_repos` merges only the changed repos.
+
+        Asserts:
+            - Repos are read newest first and the older ones are skipped.
+            - Changes keep their position and new repos are appended, in
+              a new payload that leaves the previous one untouched.
+            - The license index matches one rebuilt from scratch.
+        """
+        make_repo = self.make_repo
+        repos = [make_repo(1, "2020-01-01T00:00:00Z", "mit"),
+                 make_repo(2, "2020-01-02T00:00:00Z", "mit"),
+                 make_repo(3, "2020-01-03T00:00:00Z")]
+        changes = [make_repo(4, "2020-02-02T00:00:00Z", "mit"),
+                   make_repo(1, "2020-02-01T00:00:00Z", "apache-2.0",
+                             name="renamed"),
+                   repos[2],
+                   make_repo(2, "2020-01-02T00:00:00Z", "mit")]
+        mock_iter_pages.return_value = iter([list(repos)])
+        mock_iter_items.return_value = iter(changes)
+        with patch("client.GithubOrgClient._public_repos_url",
+                   new_callable=PropertyMock) as mock_public_repos_url:
+            mock_public_repos_url.return_value = "https://x/repos"
+            client = GithubOrgClient("google")
+            self.assertEqual(client.sync_repos(), [])
+            payload = client.repos_payload
+            self.assertEqual(client.license_index, {"mit": ["repo1",
+                                                            "repo2"]})
+            self.assertEqual(client.sync_repos(), changes[1::-1])
+        mock_iter_items.assert_called_once_with(
+            "https://x/repos?sort=updated&direction=desc")
+        self.assertEqual(payload, repos)
+        self.assertEqual(client._license_state(payload)[1],
+                         {"mit": ["repo1", "repo2"]})
+        self.assertEqual(client.public_repos(),
+                         ["renamed", "repo2", "repo3", "repo4"])
+        self.assertEqual(client.license_index,
+                         {"mit": ["repo2", "repo4"],
+                          "apache-2.0": ["renamed"]})
+        self.assertEqual(client.public_repos(license="mit"),
+                         client._repo_names(client.repos_payload, "mit"))
+
+    @patch("client.iter_json_items")
+    @patch("client.iter_json_pages")
+    def test_sync_repos_shared_cache(
+        self,
+        mock_iter_pages: MagicMock,
+        mock_iter_items: MagicMock,
+    ) -> None:
+        """
+        Test that a sync by one client sharing a cache reaches the others.
+
+        Asserts:
+            - Another client sees the merged payload and its indexes.
+            - It neither refetches the payload nor rebuilds the index.
+        """
+        make_repo = self.make_repo
+        repos = [make_repo(1, "2020-01-01T00:00:00Z", "mit"),
+                 make_repo(2, "2020-01-02T00:00:00Z", "mit")]
+        mock_iter_pages.return_value = iter([list(repos)])
+        mock_iter_items.return_value = iter(
+            [make_repo(1, "2020-02-01T00:00:00Z", "apache-2.0")])
+        cache = LRUCache()
+        with patch("client.GithubOrgClient._public_repos_url",
+                   new_callable=PropertyMock, return_value="repos"):
+            first = GithubOrgClient("g", cache=cache, incremental=True)
+            second = GithubOrgClient("g", cache=cache, incremental=True)
+            self.assertEqual(first.public_repos("mit"), ["repo1", "repo2"])
+            self.assertEqual(second.public_repos("mit"), ["repo1", "repo2"])
+            self.assertEqual(len(first.sync_repos()), 1)
+            with patch("client.extract_columns") as mock_extract:
+                self.assertEqual(second.public_repos("mit"), ["repo2"])
+                self.assertEqual(second.public_repos("apache-2.0"),
+                                 ["repo1"])
+                mock_extract.assert_not_called()
+        mock_iter_pages.assert_called_once()
+        self.assertIs(second.repos_payload, first.repos_payload)
+
+    @patch("client.iter_json_items")
+    @patch("client.iter_json_pages")
+    def test_incremental_refresh(
+        self,
+        mock_iter_pages: MagicMock,
+        mock_iter_items: MagicMock,
+    ) -> None:
+        """
+        Test that an expired payload is synced rather than re-fetched.
+        """
+        repos = [self.make_repo(1, "2020-01-01T00:00:00Z")]
+        change = self.make_repo(1, "2020-02-01T00:00:00Z", name="new")
+        mock_iter_pages.return_value = iter([list(repos)])
+        mock_iter_items.return_value = iter([change])
+        with patch("client.GithubOrgClient._public_repos_url",
+                   new_callable=PropertyMock) as mock_public_repos_url:
+            mock_public_repos_url.return_value = "repos"
+            client = GithubOrgClient("google", ttl=0, incremental=True)
+            self.assertEqual(client.public_repos(), ["repo1"])
+            client.public_repos()
+            for _ in range(100):
+                if not client._repos_payload_refreshing:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(client.public_repos(), ["new"])
+        mock_iter_pages.assert_called_once()
+
+    @patch("client.iter_json_items")
+    @patch("client.iter_json_pages")
+    def test_incremental_refresh_drops_table_after_store(
+        self,
+        mock_iter_pages: MagicMock,
+        mock_iter_items: MagicMock,
+    ) -> None:
+        """
+        Test that a repos_table built while a refresh merges changes is
+        dropped once the merged payload is stored.
+        """
+        repos = [self.make_repo(1, "2020-01-01T00:00:00Z")]
+        change = self.make_repo(1, "2020-02-01T00:00:00Z", name="new")
+        mock_iter_pages.return_value = iter([list(repos)])
+        mock_iter_items.side_effect = lambda url: iter([change])
+
+        def invalidate_then_read(obj, *names):
+            invalidate_memoized(obj, *names)
+            if names == ("repos_table",):
+                obj.repos_table
+
+        with patch("client.GithubOrgClient._public_repos_url",
+                   new_callable=PropertyMock, return_value="repos"), \
+                patch("client.invalidate_memoized",
+                      side_effect=invalidate_then_read):
+            client = GithubOrgClient("google", ttl=0, incremental=True)
+            client.repos_payload
+            client.repos_payload
+            for _ in range(100):
+                if not client._repos_payload_refreshing:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(list(client._repos_table.column("name")),
+                             ["new"])
+
+    @patch("client.get_json")
+    def test_shared_cache(self, mock_get_json: MagicMock) -> None:
+        """
+        Test that clients built alike share memoized values via `cache`.
+
+        Asserts:
+            - A second client with the same arguments does not re-fetch.
+            - Clients with other arguments or no cache fetch their own.
+        """
+        mock_get_json.side_effect = [{"v": 1}, {"v": 2}, {"v": 3}]
+        cache = LRUCache()
+        self.assertEqual(GithubOrgClient("google", cache=cache).org,
+                         {"v": 1})
+        self.assertEqual(GithubOrgClient("google", cache=cache).org,
+                         {"v": 1})
+        self.assertEqual(GithubOrgClient("abc", cache=cache).org, {"v": 2})
+        self.assertEqual(GithubOrgClient("google").org, {"v": 3})
+
+
+class TestAsyncGithubOrgClient(unittest.IsolatedAsyncioTestCase):
+    """Unit tests for the `AsyncGithubOrgClient` class."""
+
+    @patch("client.get_json_async", new_callable=AsyncMock)
+    async def test_org_is_memoized(self, mock_get_json: AsyncMock) -> None:
+        """
+        Test that concurrent `org()` calls share one request.
+
+        Asserts:
+            - Every caller gets the org payload.
+            - `get_json_async` is awaited once with the org URL.
+        """
+        mock_get_json.return_value = {"login": "google"}
+        client = AsyncGithubOrgClient("google")
+        results = await asyncio.gather(client.org(), client.org())
+        self.assertEqual(await client.org(), {"login": "google"})
+        self.assertEqual(results, [{"login": "google"}] * 2)
+        mock_get_json.assert_awaited_once_with(
+            "https://api.github.com/orgs/google"
+        )
+
+    @patch("client.get_json_async", new_callable=AsyncMock)
+    async def test_public_repos(self, mock_get_json: AsyncMock) -> None:
+        """
+        Test `public_repos()` across pages, with and without a license.
+        """
+        mock_get_json.return_value = TEST_PAYLOAD[0][0]
+        pages = [TEST_PAYLOAD[0][1][:3], TEST_PAYLOAD[0][1][3:]]
+
+        async def iter_pages(url):
+            self.assertEqual(url, TEST_PAYLOAD[0][0]["repos_url"])
+            for page in pages:
+                yield page
+
+        with patch("client.iter_json_pages_async",
+                   side_effect=iter_pages) as mock_iter_pages:
+            client = AsyncGithubOrgClient("google")
+            self.assertEqual(await client.public_repos(), TEST_PAYLOAD[0][2])
+            self.assertEqual(await client.public_repos(license="apache-2.0"),
+                             TEST_PAYLOAD[0][3])
+        mock_iter_pages.assert_called_once()
+
+
+class TestGithubOrgBatchClient(unittest.TestCase):
+    """Unit tests for the `GithubOrgBatchClient` class."""
+
+    def setUp(self) -> None:
+        """Route org fetches to in-memory payloads, one org failing."""
+        self.in_flight = 0
+        self.peak = 0
+        lock = threading.Lock()
+
+        def get_json(url):
+            with lock:
+                self.in_flight += 1
+                self.peak = max(self.peak, self.in_flight)
+            time.sleep(0.01)
+            with lock:
+                self.in_flight -= 1
+            if url.endswith("/broken"):
+                raise HTTPError("boom")
+            return {"repos_url": url + "/repos"}
+
+        def iter_items(url, projection):
+            return iter([{"name": url.split("/")[-2] + "-repo",
+                          "license": {"key": "mit"}}])
+
+        for target, side_effect in (("client.get_json", get_json),
+                                    ("client.iter_json_items", iter_items)):
+            patcher = patch(target, side_effect=side_effect)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_public_repos(self) -> None:
+        """
+        Test that results are collected per org and errors isolated.
+
+        Asserts:
+            - Successful orgs map to their repo names, in input order.
+            - The failing org is reported in `errors`.
+            - No more than `max_workers` orgs are fetched at once.
+        """
+        names = ["org{}".format(i) for i in range(8)] + ["broken"]
+        result = GithubOrgBatchClient(names, max_workers=3) \
+            .public_repos(license="mit")
+        self.assertEqual(list(result.repos), names[:-1])
+        self.assertEqual(result.repos["org5"], ["org5-repo"])
+        self.assertIsInstance(result.errors["broken"], HTTPError)
+        self.assertLessEqual(self.peak, 3)
+
+    def test_iter_public_repos(self) -> None:
+        """
+        Test that every org is streamed exactly once.
+        """
+        results = list(GithubOrgBatchClient(["a", "b", "a"])
+                       .iter_public_repos())
+        self.assertEqual(sorted(result.org for result in results),
+                         ["a", "b"])
+        self.assertTrue(all(result.error is None for result in results))
+
 
 @parameterized_class([
     {
@@ -168,19 +574,24 @@ class TestIntegrationGithubOrgClient(unittest.TestCase):
         """
         Set up class-level fixtures before running the integration tests.
 
-        Sets up a mock for `requests.get` function to simulate API responses.
+        Sets up a mock for the pooled session's `get` to simulate API
+        responses.
         """
         route_payload = {
             'https://api.github.com/orgs/google': cls.org_payload,
             'https://api.github.com/orgs/google/repos': cls.repos_payload,
         }
 
-        def get_payload(url):
+        def get_payload(url, **kwargs):
             if url in route_payload:
-                return Mock(**{'json.return_value': route_payload[url]})
+                content = json.dumps(route_payload[url]).encode()
+                response = Mock(links={}, headers={})
+                response.raw.stream.return_value = iter([content])
+                return response
             raise HTTPError
 
-        cls.get_patcher = patch("requests.get", side_effect=get_payload)
+        cls.get_patcher = patch("requests.Session.get",
+                                side_effect=get_payload)
         cls.get_patcher.start()
 
     def test_public_repos(self) -> None:
@@ -212,7 +623,7 @@ class TestIntegrationGithubOrgClient(unittest.TestCase):
         """
         Tear down class-level fixtures after running the integration tests.
 
-        Stops the mock patch for `requests.get`.
+        Stops the mock patch for the session's `get`.
         """
         cls.get_patcher.stop()
 
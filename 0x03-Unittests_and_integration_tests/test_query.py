@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Unit tests for the repo query engine.
+
+Queries run on the integration fixtures, directly through `run_query`
+and through `GithubOrgClient.query` with its indexes.
+"""
+
+import unittest
+from unittest.mock import PropertyMock, patch
+
+from parameterized import parameterized
+
+from client import GithubOrgClient
+from fixtures import TEST_PAYLOAD
+from query import plan_query, run_query, top_k
+from utils import project
+
+REPOS = TEST_PAYLOAD[0][1]
+
+
+def names(records):
+    """Names of ``records``"""
+    return [record["name"] for record in records]
+
+
+class TestRunQuery(unittest.TestCase):
+    """Unit tests for `run_query` and `plan_query`."""
+
+    @parameterized.expand([
+        ({"fork": False, "language": "JavaScript"},
+         ["kratu", "traceur-compiler"]),
+        ({"forks": (">=", 395)},
+         ["dagger", "ios-webkit-debug-proxy", "traceur-compiler"]),
+        ({"license.key": ("in", {"bsl-1.0", "other"}), "fork": True},
+         ["cpp-netlib", "build-debian-cloud"]),
+        ({"license.key": None}, ["google.github.io"]),
+        ({"updated_at": lambda value: value.startswith("2019-09")},
+         ["episodes.dart", "build-debian-cloud", "firmata.py"]),
+        ({"owner.login": "google", "private": ("!=", False)}, []),
+    ])
+    def test_where(self, where, expected):
+        """
+        Test that every condition must hold for a repo to match.
+        """
+        self.assertEqual(names(run_query(REPOS, where)), expected)
+
+    def test_order_limit_and_fields(self):
+        """
+        Test sorting on several keys, cutting and projecting.
+        """
+        self.assertEqual(
+            run_query(REPOS, {"fork": False}, order_by="-forks", limit=2,
+                      fields=["name", "forks"]),
+            [{"name": "traceur-compiler", "forks": 604},
+             {"name": "ios-webkit-debug-proxy", "forks": 395}])
+        self.assertEqual(
+            names(run_query(REPOS, order_by=["forks", "-name"], limit=3)),
+            ["firmata.py", "episodes.dart", "build-debian-cloud"])
+        self.assertEqual(
+            names(run_query(REPOS, order_by="-license.key"))[-1],
+            "google.github.io")
+        self.assertEqual(names(run_query(REPOS, limit=2)),
+                         ["episodes.dart", "cpp-netlib"])
+
+    def test_invalid_condition(self):
+        """
+        Test that unknown operators are rejected.
+        """
+        with self.assertRaises(ValueError):
+            run_query(REPOS, {"forks": ("~", 1)})
+
+    def test_plan_picks_smallest_index(self):
+        """
+        Test that the most selective indexed equality drives the pass.
+        """
+        indexes = {"language": {"JavaScript": [5, 7]},
+                   "license.key": {"apache-2.0": [2, 5, 7, 8]}}
+        plan = plan_query(
+            {"license.key": "apache-2.0", "language": "JavaScript",
+             "fork": False},
+            indexes.get)
+        self.assertEqual((plan.index_field, plan.positions),
+                         ("language", [5, 7]))
+        self.assertTrue(plan.predicate({"license": {"key": "apache-2.0"},
+                                        "fork": False}))
+        self.assertFalse(plan.predicate({"license": {"key": "mit"},
+                                         "fork": False}))
+        self.assertIsNone(plan_query({"fork": False}, indexes.get).positions)
+
+    @parameterized.expand([
+        ("-forks",),
+        ("updated_at",),
+        (["fork", "-license.key", "name"],),
+    ])
+    def test_top_k_matches_full_sort(self, order_by):
+        """
+        Test that the heap returns the head of the fully sorted list.
+        """
+        ordered = names(run_query(REPOS, order_by=order_by))
+        for k in range(len(REPOS) + 2):
+            self.assertEqual(names(top_k(iter(REPOS), k, order_by)),
+                             ordered[:k])
+
+    def test_top_k_keeps_ties_in_order(self):
+        """
+        Test that equal keys come out in their original order.
+        """
+        self.assertEqual(
+            names(top_k(iter(REPOS), 3, "-fork", {"forks": ("<", 100)})),
+            ["cpp-netlib", "build-debian-cloud", "episodes.dart"])
+
+
+class TestClientQuery(unittest.TestCase):
+    """Unit tests for `GithubOrgClient.query`."""
+
+    @patch("client.iter_json_pages")
+    def test_query_uses_indexes(self, mock_iter_pages):
+        """
+        Test that indexed queries agree with a scan and reuse indexes.
+        """
+        mock_iter_pages.return_value = iter([REPOS])
+        with patch("client.GithubOrgClient._public_repos_url",
+                   new_callable=PropertyMock, return_value="repos"):
+            client = GithubOrgClient("google")
+            where = {"language": "JavaScript", "license.key": "apache-2.0"}
+            self.assertEqual(names(client.query(where)),
+                             names(run_query(REPOS, where)))
+            self.assertEqual(client.field_index("language")["Python"], [8])
+            self.assertIsNone(client.field_index("forks"))
+            with patch("client.extract_columns") as mock_extract:
+                self.assertEqual(
+                    client.query({"language": "Python"}, fields=["name"]),
+                    [{"name": "firmata.py"}])
+                mock_extract.assert_not_called()
+
+    def test_query_reads_payload_once(self):
+        """
+        Test that records and index positions come from one payload,
+        even when repos_payload changes during the query.
+        """
+        payloads = iter([REPOS, REPOS[:3]])
+        with patch("client.GithubOrgClient.repos_payload",
+                   new_callable=PropertyMock,
+                   side_effect=lambda: next(payloads)):
+            client = GithubOrgClient("google")
+            self.assertEqual(
+                client.query({"language": "Python"}, fields=["name"]),
+                [{"name": "firmata.py"}])
+
+    @patch("client.iter_json_items")
+    def test_top_repos_streams(self, mock_iter_items):
+        """
+        Test that top-k helpers stream only the fields they need.
+
+        Asserts:
+            - Repos are streamed with a projection, not loaded whole.
+            - The helpers return the expected names.
+        """
+        mock_iter_items.side_effect = \
+            lambda url, fields: iter(project(REPOS, fields))
+        with patch("client.GithubOrgClient._public_repos_url",
+                   new_callable=PropertyMock, return_value="repos"):
+            client = GithubOrgClient("google")
+            self.assertEqual(
+                client.top_repos(2, "-forks", {"fork": False},
+                                 fields=["name", "forks"]),
+                [{"name": "traceur-compiler", "forks": 604},
+                 {"name": "ios-webkit-debug-proxy", "forks": 395}])
+            mock_iter_items.assert_called_once_with(
+                "repos", ("name", "forks", "fork"))
+            self.assertEqual(client.most_forked(3),
+                             ["dagger", "traceur-compiler",
+                              "ios-webkit-debug-proxy"])
+            self.assertEqual(client.recently_updated(2),
+                             ["ios-webkit-debug-proxy", "dagger"])
+        self.assertFalse(hasattr(client, "_repos_payload"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Unit tests for the memory-mapped `RepoStore`.
+
+Stores are written from the integration fixtures and checked against the
+answers `GithubOrgClient` gives on the raw payload.
+"""
+
+import mmap
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from client import GithubOrgClient, publish_repo_store
+from fixtures import TEST_PAYLOAD
+from repo_store import RepoStore, write_repo_store
+
+ORG, REPOS, EXPECTED_REPOS, APACHE2_REPOS = TEST_PAYLOAD[0]
+
+
+class TestRepoStore(unittest.TestCase):
+    """Unit tests for `write_repo_store` and `RepoStore`."""
+
+    def setUp(self) -> None:
+        """Write a store holding the fixture repos and an empty org."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "repos.store")
+        write_repo_store(self.path, [("google", REPOS), ("empty", [])])
+        self.store = RepoStore(self.path)
+
+    def test_names(self) -> None:
+        """
+        Test that names, optionally by license, match the payload.
+        """
+        self.assertEqual(list(self.store), ["google", "empty"])
+        self.assertEqual(self.store.count("google"), len(REPOS))
+        self.assertEqual(self.store.names("google"), EXPECTED_REPOS)
+        self.assertEqual(self.store.names("google", "apache-2.0"),
+                         APACHE2_REPOS)
+        self.assertEqual(self.store.names("google", "unknown"), [])
+        self.assertEqual(self.store.names("empty"), [])
+        self.assertIsNone(self.store.names("missing"))
+
+    def test_records(self) -> None:
+        """
+        Test that stored repos decode back to the original records.
+        """
+        self.assertEqual(self.store.repo("google", 3), REPOS[3])
+        self.assertEqual(list(self.store.repos("google")), REPOS)
+        with self.assertRaises(IndexError):
+            self.store.repo("google", len(REPOS))
+
+    def test_swap_is_picked_up(self) -> None:
+        """
+        Test that a replaced file is read after the next check only.
+        """
+        store = RepoStore(self.path, check_interval=3600)
+        write_repo_store(self.path, [("google", REPOS[:1])])
+        self.assertEqual(store.names("google"), EXPECTED_REPOS)
+        self.assertTrue(store.refresh())
+        self.assertEqual(store.names("google"), EXPECTED_REPOS[:1])
+        self.assertNotIn("empty", store)
+        self.assertFalse(store.refresh())
+
+    def test_rejects_other_files(self) -> None:
+        """
+        Test that files not written by `write_repo_store` are refused.
+        """
+        with open(self.path, "wb") as store_file:
+            store_file.write(b"GHRS" + bytes(100))
+        maps, original = [], mmap.mmap
+
+        def mapped(*args, **kwargs):
+            maps.append(original(*args, **kwargs))
+            return maps[-1]
+
+        with patch("repo_store.mmap.mmap", side_effect=mapped), \
+                self.assertRaises(ValueError):
+            RepoStore(self.path)
+        self.assertTrue(maps[0].closed)
+
+    @patch("client.iter_json_pages")
+    def test_client_reads_store(self, mock_iter_pages) -> None:
+        """
+        Test that a client with a store answers without any request.
+        """
+        mock_iter_pages.return_value = iter([REPOS])
+        with patch("client.GithubOrgClient._public_repos_url", "repos"):
+            self.assertEqual(
+                publish_repo_store([GithubOrgClient("google")], self.path),
+                1)
+        mock_iter_pages.reset_mock()
+        self.store.refresh()
+        client = GithubOrgClient("google", store=self.store)
+        self.assertEqual(client.public_repos(license="apache-2.0"),
+                         APACHE2_REPOS)
+        self.assertEqual(client.public_repos(), EXPECTED_REPOS)
+        mock_iter_pages.assert_not_called()
+
+    @patch("client.iter_json_pages")
+    def test_client_falls_back(self, mock_iter_pages) -> None:
+        """
+        Test that orgs missing from the store are fetched, even when
+        the file is swapped for one without the org.
+        """
+        mock_iter_pages.return_value = iter([REPOS])
+        store = RepoStore(self.path, check_interval=0)
+        write_repo_store(self.path, [("empty", [])])
+        client = GithubOrgClient("google", store=store)
+        with patch("client.GithubOrgClient._public_repos_url", "repos"):
+            self.assertEqual(client.public_repos(), EXPECTED_REPOS)
+        mock_iter_pages.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
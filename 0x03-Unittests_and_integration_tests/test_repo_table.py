@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Unit tests for the `RepoTable` columnar repos representation.
+
+The table is built from the integration fixtures and checked against the
+answers `GithubOrgClient` gives on the raw payload.
+"""
+
+import sys
+import unittest
+from array import array
+from unittest.mock import MagicMock, PropertyMock, patch
+
+from client import GithubOrgClient
+from fixtures import TEST_PAYLOAD
+from repo_table import RepoTable
+
+REPOS = TEST_PAYLOAD[0][1]
+
+
+class TestRepoTable(unittest.TestCase):
+    """Unit tests for the `RepoTable` class."""
+
+    def setUp(self) -> None:
+        """Build a table with a few extra fields."""
+        self.table = RepoTable.from_records(
+            iter(REPOS), ["forks", "fork", "owner.login", "name"])
+
+    def test_fields_and_length(self) -> None:
+        """
+        Test that only the requested fields are kept, required ones first.
+        """
+        self.assertEqual(self.table.fields,
+                         ("name", "license.key", "forks", "fork",
+                          "owner.login"))
+        self.assertEqual(len(self.table), len(REPOS))
+
+    def test_compact_columns(self) -> None:
+        """
+        Test that integer and boolean columns are arrays and strings are
+        interned.
+        """
+        self.assertEqual(self.table.column("forks"),
+                         array("q", [repo["forks"] for repo in REPOS]))
+        self.assertEqual(self.table.column("fork").typecode, "b")
+        logins = self.table.column("owner.login")
+        self.assertIs(logins[0], sys.intern("google"))
+        self.assertIs(logins[0], logins[-1])
+
+    def test_positions(self) -> None:
+        """
+        Test that license lookups match the expected fixture repos.
+        """
+        positions = self.table.positions("license.key", "apache-2.0")
+        self.assertEqual(self.table.take("name", positions),
+                         TEST_PAYLOAD[0][3])
+        self.assertEqual(self.table.positions("license.key", "none"), [])
+
+    def test_rows(self) -> None:
+        """
+        Test that rows read back as flat dicts.
+        """
+        row = next(self.table.rows(["name", "license.key"]))
+        self.assertEqual(row, {"name": REPOS[0]["name"],
+                               "license.key": REPOS[0]["license"]["key"]})
+        with self.assertRaises(KeyError):
+            self.table.column("stargazers_count")
+
+
+class TestColumnarGithubOrgClient(unittest.TestCase):
+    """Tests for `GithubOrgClient` in columnar mode."""
+
+    @patch("client.iter_json_items")
+    def test_public_repos(self, mock_iter_items: MagicMock) -> None:
+        """
+        Test that `public_repos` answers from the table without keeping the
+        raw payload.
+        """
+        mock_iter_items.return_value = iter(REPOS)
+        with patch("client.GithubOrgClient._public_repos_url",
+                   new_callable=PropertyMock) as mock_public_repos_url:
+            mock_public_repos_url.return_value = "repos"
+            client = GithubOrgClient("google", columnar=True)
+            self.assertEqual(client.public_repos(), TEST_PAYLOAD[0][2])
+            self.assertEqual(client.public_repos(license="apache-2.0"),
+                             TEST_PAYLOAD[0][3])
+        self.assertFalse(hasattr(client, "_repos_payload"))
+        mock_iter_items.assert_called_once_with(
+            "repos", ("name", "license.key"))
+
+
+if __name__ == '__main__':
+    unittest.main()
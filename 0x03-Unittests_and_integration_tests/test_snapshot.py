@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Unit tests for org client snapshots.
+
+Snapshots are written from clients warmed with the integration fixtures
+and read back with every network helper patched to fail.
+"""
+
+import os
+import struct
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from client import GithubOrgClient, dump_snapshots, load_snapshots
+from fixtures import TEST_PAYLOAD
+from snapshot import Snapshot, write_snapshot
+
+ORG, REPOS, EXPECTED_REPOS, APACHE2_REPOS = TEST_PAYLOAD[0]
+
+
+class TestSnapshot(unittest.TestCase):
+    """Unit tests for `write_snapshot`, `Snapshot` and the client API."""
+
+    def setUp(self) -> None:
+        """Create a scratch directory and block network access."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "orgs.snap")
+        for target in ("client.get_json", "client.iter_json_pages",
+                       "client.iter_json_items"):
+            patcher = patch(target, side_effect=AssertionError(target))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def warm_client(self, org_name: str) -> GithubOrgClient:
+        """Client whose memoized state is already loaded."""
+        client = GithubOrgClient(org_name)
+        client._org = ORG
+        client._repos_payload = REPOS
+        return client
+
+    def test_round_trip(self) -> None:
+        """
+        Test that a dumped client loads back without any request.
+
+        Asserts:
+            - The org and repos read back equal the dumped ones.
+            - Streaming and license filters work on the restored repos.
+        """
+        self.warm_client("google").dump_snapshot(self.path)
+        client = GithubOrgClient.load_snapshot(self.path)
+        self.assertEqual(client.org, ORG)
+        self.assertEqual(client.repos_payload, REPOS)
+        self.assertEqual(client.public_repos(license="apache-2.0"),
+                         APACHE2_REPOS)
+        stream = GithubOrgClient.load_snapshot(self.path, stream=True)
+        self.assertEqual(stream.public_repos(), EXPECTED_REPOS)
+
+    def test_bulk_is_lazy(self) -> None:
+        """
+        Test that a bulk snapshot decodes an org only when it is read.
+        """
+        written = dump_snapshots(
+            [self.warm_client(name) for name in ("google", "abc")],
+            self.path)
+        self.assertEqual(written, 2)
+        with patch.object(Snapshot, "_load",
+                          autospec=True,
+                          side_effect=Snapshot._load) as mock_load:
+            clients = load_snapshots(self.path)
+            self.assertEqual(list(clients), ["google", "abc"])
+            mock_load.assert_not_called()
+            self.assertEqual(clients["abc"].public_repos(), EXPECTED_REPOS)
+            self.assertEqual(mock_load.call_count, 1)
+            self.assertEqual(clients["abc"].org, ORG)
+            self.assertEqual(mock_load.call_count, 2)
+        with self.assertRaises(ValueError):
+            GithubOrgClient.load_snapshot(self.path)
+
+    def test_refresh_after_restore_uses_api(self) -> None:
+        """
+        Test that the snapshot only provides the first value.
+        """
+        write_snapshot(self.path, [("google", {"v": 1}, [])])
+        client = GithubOrgClient.load_snapshot(self.path)
+        with patch("client.get_json", return_value={"v": 2}):
+            self.assertEqual(client.org, {"v": 1})
+            del client._org
+            self.assertEqual(client.org, {"v": 2})
+
+    def test_rejects_other_versions(self) -> None:
+        """
+        Test that foreign or outdated files are refused.
+        """
+        write_snapshot(self.path, [("google", ORG, REPOS)])
+        with open(self.path, "r+b") as snapshot_file:
+            snapshot_file.seek(4)
+            snapshot_file.write(struct.pack("B", 0))
+        with self.assertRaises(ValueError):
+            Snapshot(self.path)
+        with open(self.path, "wb") as snapshot_file:
+            snapshot_file.write(b"not a snapshot")
+        with self.assertRaises(ValueError):
+            Snapshot(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
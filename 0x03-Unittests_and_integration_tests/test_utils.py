@@ -3,10 +3,119 @@
 A module for testing the access_nested_map function from the utils module.
 """
 
+import asyncio
+import gc
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
 import unittest
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import MappingProxyType
 from unittest.mock import patch, Mock
 from parameterized import parameterized
-from utils import access_nested_map, get_json, memoize
+from fixtures import TEST_PAYLOAD
+import utils
+from utils import (
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    DiskCache,
+    LRUCache,
+    JSONResponse,
+    RateLimiter,
+    RequestCoalescer,
+    access_nested_map,
+    async_memoize,
+    close_async_session,
+    compile_path,
+    configure_disk_cache,
+    configure_json_decoder,
+    configure_session,
+    connection_stats,
+    decode_json,
+    extract_columns,
+    fetch_json,
+    fetch_json_async,
+    get_json,
+    get_json_async,
+    get_session,
+    invalidate_memoized,
+    iter_json_array,
+    iter_json_items,
+    iter_json_pages,
+    iter_json_pages_async,
+    memoize,
+    project,
+    request_coalescer,
+    request_priority,
+    transfer_stats,
+    validator_cache,
+)
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    """Serve ``server.routes[path]`` as JSON over keep-alive HTTP/1.1."""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        etag = self.server.etags.get(self.path)
+        if etag is not None and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps(self.server.routes[self.path]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if self.server.compress and \
+                "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        if etag is not None:
+            self.send_header("ETag", etag)
+        for name, value in self.server.headers.get(self.path, {}).items():
+            self.send_header(name, value.format(url=self.server.url))
+        if self.server.chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for start in range(0, len(body), 1024):
+                chunk = body[start:start + 1024]
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def body_response(content, **attrs):
+    """Mock streamed response whose raw body is ``content``."""
+    response = Mock(**attrs)
+    response.raw.stream.side_effect = lambda *args, **kwargs: iter([content])
+    return response
+
+
+def start_json_server(routes, headers=None):
+    """Start a local JSON server in a thread and return it."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _JSONHandler)
+    server.routes = routes
+    server.headers = headers or {}
+    server.etags = {}
+    server.requests = []
+    server.compress = False
+    server.chunked = False
+    server.url = "http://127.0.0.1:{}".format(server.server_port)
+    threading.Thread(target=server.serve_forever, args=(0.05,),
+                     daemon=True).start()
+    return server
 
 
 class TestAccessNestedMap(unittest.TestCase):
@@ -85,20 +194,339 @@ class TestGetJson(unittest.TestCase):
 
         Asserts:
             The return value of get_json is equal to the expected payload.
-            requests.get is called exactly once with the test_url.
+            The pooled session's get (requests.Session.get) is called
+            exactly once with the test_url, no conditional headers and
+            stream=True.
         """
-        # Mock the requests.get method
-        with patch("requests.get") as mock_get:
-            # Set up the mock to return a mock response with the json method
-            mock_response = Mock()
-            mock_response.json.return_value = test_payload
-            mock_get.return_value = mock_response
+        # Mock the pooled session's get method
+        with patch("requests.Session.get") as mock_get:
+            # Set up the mock to return a mock response with the raw body
+            mock_get.return_value = body_response(
+                json.dumps(test_payload).encode(), headers={})
 
             # Call get_json and assert it returns the expected payload
             self.assertEqual(get_json(test_url), test_payload)
 
-            # Verify that requests.get was called exactly once with test_url
-            mock_get.assert_called_once_with(test_url)
+            # Verify that the session was called exactly once with test_url
+            mock_get.assert_called_once_with(test_url, headers={},
+                                             stream=True)
+
+
+class TestPooledSession(unittest.TestCase):
+    """
+    Contains tests for the pooled session behind get_json.
+    """
+
+    def setUp(self):
+        self.server = start_json_server({"/org": {"login": "google"}})
+        configure_session()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        configure_session()
+
+    def test_pool_size_is_configurable(self):
+        """
+        Test that configure_session sizes the per-host pool.
+        """
+        session = configure_session(pool_maxsize=4)
+        self.assertIs(get_session(), session)
+        self.assertEqual(session.get_adapter(self.server.url)._pool_maxsize,
+                         4)
+
+    def test_connection_is_reused(self):
+        """
+        Test that consecutive calls share one keep-alive connection.
+
+        Asserts:
+            One connection is opened and then reused, and both calls
+            return the payload.
+        """
+        before = connection_stats()
+        for _ in range(2):
+            self.assertEqual(get_json(self.server.url + "/org"),
+                             {"login": "google"})
+        after = connection_stats()
+        self.assertEqual(after["opened"] - before["opened"], 1)
+        self.assertEqual(after["reused"] - before["reused"], 1)
+
+
+class TestIterJsonPages(unittest.TestCase):
+    """
+    Contains tests for iter_json_pages.
+    """
+
+    def setUp(self):
+        self.server = start_json_server(
+            {"/repos": [1, 2], "/repos?page=2": [3]},
+            {"/repos": {"Link": '<{url}/repos?page=2>; rel="next"'}},
+        )
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_follows_next_links(self):
+        """
+        Test that every page is yielded in order.
+        """
+        self.assertEqual(list(iter_json_pages(self.server.url + "/repos")),
+                         [[1, 2], [3]])
+
+    def test_pages_are_fetched_lazily(self):
+        """
+        Test that a page is only requested once the previous one is used.
+        """
+        with patch("utils.fetch_json", wraps=utils.fetch_json) as mock_fetch:
+            pages = iter_json_pages(self.server.url + "/repos")
+            self.assertEqual(next(pages), [1, 2])
+            self.assertEqual(mock_fetch.call_count, 1)
+
+
+class TestConcurrentPages(unittest.TestCase):
+    """
+    Contains tests for the concurrent prefetch path of iter_json_pages.
+    """
+
+    def setUp(self):
+        link = '<{url}/repos?page=2>; rel="next", ' \
+               '<{url}/repos?page=3>; rel="last"'
+        self.server = start_json_server(
+            {"/repos": [1], "/repos?page=2": [2], "/repos?page=3": [3]},
+            {"/repos": {"Link": link}},
+        )
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_remaining_pages_fetched_concurrently_in_order(self):
+        """
+        Test that pages after the first are fetched in parallel.
+
+        Asserts:
+            Pages 2 and 3 are in flight together (the barrier only opens
+            for two concurrent callers) and are yielded in page order.
+        """
+        barrier = threading.Barrier(2, timeout=5)
+        fetch = utils.get_json
+
+        def concurrent_get_json(url, **kwargs):
+            barrier.wait()
+            return fetch(url, **kwargs)
+
+        with patch("utils.get_json", side_effect=concurrent_get_json):
+            pages = list(iter_json_pages(self.server.url + "/repos",
+                                         max_workers=2))
+        self.assertEqual(pages, [[1], [2], [3]])
+
+    def test_serial_without_workers(self):
+        """
+        Test that the default path still follows next links only.
+        """
+        with patch("utils.get_json") as mock_get_json:
+            pages = list(iter_json_pages(self.server.url + "/repos"))
+        self.assertEqual(pages, [[1], [2]])
+        mock_get_json.assert_not_called()
+
+
+class TestConditionalRequests(unittest.TestCase):
+    """
+    Contains tests for the ETag validator cache behind get_json.
+    """
+
+    def setUp(self):
+        validator_cache.clear()
+        self.server = start_json_server({"/org": {"login": "google"}})
+        self.server.etags["/org"] = '"v1"'
+        self.url = self.server.url + "/org"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        validator_cache.clear()
+
+    def test_not_modified_returns_cached_body(self):
+        """
+        Test that a 304 reuses the previously parsed body.
+
+        Asserts:
+            The second request sends If-None-Match and gets back the very
+            same object, without decoding a body.
+        """
+        first = get_json(self.url)
+        second = get_json(self.url)
+        self.assertIs(second, first)
+        self.assertNotIn("If-None-Match", self.server.requests[0])
+        self.assertEqual(self.server.requests[1]["If-None-Match"], '"v1"')
+
+    def test_changed_resource_is_decoded_again(self):
+        """
+        Test that a new ETag replaces the cached body.
+        """
+        get_json(self.url)
+        self.server.routes["/org"] = {"login": "alphabet"}
+        self.server.etags["/org"] = '"v2"'
+        self.assertEqual(get_json(self.url), {"login": "alphabet"})
+        self.assertIs(get_json(self.url), get_json(self.url))
+
+
+class TestDiskCache(unittest.TestCase):
+    """
+    Contains tests for the on-disk response cache.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_round_trip(self):
+        """
+        Test that a stored response is loaded back intact.
+        """
+        cache = DiskCache(self.tmp.name)
+        response = JSONResponse([{"name": "kratu", "fork": False}], {})
+        cache.put("http://a", response)
+        self.assertEqual(DiskCache(self.tmp.name).get("http://a"), response)
+        self.assertIsNone(cache.get("http://b"))
+
+    def test_expired_entry_is_a_miss(self):
+        """
+        Test that entries past their TTL are dropped.
+        """
+        cache = DiskCache(self.tmp.name, ttl=60)
+        cache.put("http://a", JSONResponse(1, {}), ttl=-1)
+        self.assertIsNone(cache.get("http://a"))
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_least_recently_used_is_evicted(self):
+        """
+        Test that the size cap evicts the least recently read entry.
+        """
+        cache = DiskCache(self.tmp.name, max_bytes=10 ** 6)
+        for url, mtime in (("http://a", 1), ("http://b", 2)):
+            cache.put(url, JSONResponse("x" * 100, {}))
+            os.utime(cache._path(url), (mtime, mtime))
+        cache.get("http://a")
+        cache.max_bytes = 2 * os.path.getsize(cache._path("http://a"))
+        cache.put("http://c", JSONResponse("x" * 100, {}))
+        self.assertIsNotNone(cache.get("http://a"))
+        self.assertIsNone(cache.get("http://b"))
+        self.assertIsNotNone(cache.get("http://c"))
+
+    def test_puts_do_not_rescan(self):
+        """
+        Test that writes under the size cap do not scan the directory.
+
+        Asserts:
+            Fifty puts scan the directory once, then again only once the
+            estimate crosses max_bytes, which trims the directory back.
+        """
+        cache = DiskCache(self.tmp.name, max_bytes=10 ** 6)
+        with patch.object(DiskCache, "_entries",
+                          autospec=True,
+                          side_effect=DiskCache._entries) as entries:
+            for i in range(50):
+                cache.put("http://{}".format(i), JSONResponse("x" * 100, {}))
+            self.assertEqual(entries.call_count, 1)
+            cache.max_bytes = 10 * os.path.getsize(cache._path("http://0"))
+            cache.put("http://50", JSONResponse("x" * 100, {}))
+            self.assertEqual(entries.call_count, 2)
+        self.assertEqual(len(os.listdir(self.tmp.name)), 10)
+
+    def test_get_json_served_from_disk(self):
+        """
+        Test that get_json skips the network on a warm disk cache.
+        """
+        configure_disk_cache(self.tmp.name)
+        self.addCleanup(configure_disk_cache, None)
+        server = start_json_server({"/org": {"login": "google"}})
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        for _ in range(2):
+            self.assertEqual(get_json(server.url + "/org"),
+                             {"login": "google"})
+        self.assertEqual(len(server.requests), 1)
+
+
+class TestGetJsonAsync(unittest.IsolatedAsyncioTestCase):
+    """
+    Contains tests for the non-blocking get_json_async helpers.
+    """
+
+    def setUp(self):
+        validator_cache.clear()
+        self.server = start_json_server(
+            {"/repos": [1, 2], "/repos?page=2": [3]},
+            {"/repos": {"Link": '<{url}/repos?page=2>; rel="next"'}},
+        )
+
+    async def asyncTearDown(self):
+        await close_async_session()
+        self.server.shutdown()
+        self.server.server_close()
+
+    async def test_get_json_async(self):
+        """
+        Test that get_json_async returns the decoded payload.
+        """
+        self.assertEqual(await get_json_async(self.server.url + "/repos"),
+                         [1, 2])
+
+    async def test_async_disk_cache_and_projection(self):
+        """
+        Test that the async path reads and fills the disk cache, apart
+        for each projection.
+
+        Asserts:
+            A projected fetch is stored, then served from disk without a
+            request, and the blocking path shares the entry.
+        """
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        configure_disk_cache(tmp.name)
+        self.addCleanup(configure_disk_cache, None)
+        self.server.routes["/org"] = {"login": "google", "id": 1}
+        url = self.server.url + "/org"
+        self.assertEqual(await get_json_async(url, ["login"]),
+                         {"login": "google"})
+        self.assertEqual(await get_json_async(url, ["login"]),
+                         {"login": "google"})
+        self.assertEqual(get_json(url, ["login"]), {"login": "google"})
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(await get_json_async(url),
+                         {"login": "google", "id": 1})
+        self.assertEqual(len(self.server.requests), 2)
+
+    async def test_iter_json_pages_async(self):
+        """
+        Test that the async page iterator follows next links.
+        """
+        pages = [page async for page in
+                 iter_json_pages_async(self.server.url + "/repos")]
+        self.assertEqual(pages, [[1, 2], [3]])
+
+    async def test_async_memoize_retries_after_failure(self):
+        """
+        Test that a failed computation is not memoized.
+        """
+        calls = []
+
+        class TestClass:
+            @async_memoize
+            async def a_method(self):
+                calls.append(1)
+                if len(calls) == 1:
+                    raise ValueError
+                return 42
+
+        test_class = TestClass()
+        with self.assertRaises(ValueError):
+            await test_class.a_method()
+        self.assertEqual(await test_class.a_method(), 42)
+        self.assertEqual(await test_class.a_method(), 42)
+        self.assertEqual(len(calls), 2)
 
 
 class TestMemoize(unittest.TestCase):
@@ -143,6 +571,843 @@ class TestMemoize(unittest.TestCase):
             # Assert that a_method was only called once
             mock_method.assert_called_once()
 
+    def test_memoize_is_single_flight(self):
+        """
+        Test that threads racing on a cold property compute it once.
+
+        Asserts:
+            Every thread receives the same object and the underlying
+            method runs a single time.
+        """
+        calls = []
+        started = threading.Barrier(8, timeout=5)
+
+        class TestClass:
+            @memoize
+            def a_property(self):
+                calls.append(1)
+                time.sleep(0.05)
+                return object()
+
+        test_class = TestClass()
+        results = []
+
+        def read():
+            started.wait()
+            results.append(test_class.a_property)
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result is results[0] for result in results))
+
+
+class TestMemoizeExpiry(unittest.TestCase):
+    """
+    Contains tests for memoize(ttl=...) and invalidate_memoized.
+    """
+
+    def make_instance(self, ttl=None):
+        """Return an object whose memoized properties count their calls."""
+        counter = iter(range(100))
+
+        class TestClass:
+            @memoize(ttl=ttl)
+            def a_property(self):
+                return next(counter)
+
+            @memoize
+            def b_property(self):
+                return next(counter)
+
+        return TestClass()
+
+    def test_expired_value_is_served_while_refreshing(self):
+        """
+        Test that a read after expiry returns the stale value at once and
+        that a background refresh replaces it.
+        """
+        test_class = self.make_instance(ttl=0.01)
+        self.assertEqual(test_class.a_property, 0)
+        time.sleep(0.02)
+        self.assertEqual(test_class.a_property, 0)
+        for _ in range(100):
+            if not test_class._a_property_refreshing:
+                break
+            time.sleep(0.01)
+        self.assertEqual(test_class.a_property, 1)
+
+    def test_invalidate_one_property(self):
+        """
+        Test that invalidating one property leaves the others cached.
+        """
+        test_class = self.make_instance()
+        self.assertEqual((test_class.a_property, test_class.b_property),
+                         (0, 1))
+        invalidate_memoized(test_class, "a_property")
+        self.assertEqual((test_class.a_property, test_class.b_property),
+                         (2, 1))
+
+    def test_invalidate_all_properties(self):
+        """
+        Test that invalidating without names drops every value.
+        """
+        test_class = self.make_instance()
+        test_class.a_property, test_class.b_property
+        invalidate_memoized(test_class)
+        self.assertEqual((test_class.b_property, test_class.a_property),
+                         (2, 3))
+        with self.assertRaises(AttributeError):
+            invalidate_memoized(test_class, "missing")
+
+
+class TestCompilePath(unittest.TestCase):
+    """
+    Contains tests for compiled path accessors.
+    """
+
+    @parameterized.expand([
+        ({"a": {"b": 2}}, ("a", "b"), 2),
+        (MappingProxyType({"a": MappingProxyType({"b": 2})}), ["a", "b"], 2),
+        ({"a": 1}, (), {"a": 1}),
+    ])
+    def test_compile_path(self, nested_map, path, expected):
+        """
+        Test that accessors match access_nested_map for dicts and other
+        mappings.
+        """
+        self.assertEqual(compile_path(path)(nested_map), expected)
+
+    @parameterized.expand([
+        ({}, ("a",), KeyError("a")),
+        ({"a": 1}, ("a", "b"), KeyError("b")),
+        ({"a": [1]}, ("a", "b"), KeyError("b")),
+    ])
+    def test_compile_path_exception(self, nested_map, path,
+                                    expected_exception):
+        """
+        Test that accessors raise the same KeyError as access_nested_map.
+        """
+        with self.assertRaises(KeyError) as context:
+            compile_path(path)(nested_map)
+        self.assertEqual(str(context.exception), str(expected_exception))
+
+    def test_accessors_are_cached(self):
+        """
+        Test that compiling the same path twice returns one accessor.
+        """
+        self.assertIs(compile_path(["license", "key"]),
+                      compile_path(("license", "key")))
+
+
+class TestExtractColumns(unittest.TestCase):
+    """
+    Contains tests for the extract_columns batch accessor.
+    """
+
+    def test_extract_columns(self):
+        """
+        Test that each path becomes one column, misses getting the fill.
+        """
+        records = iter([
+            {"name": "a", "license": {"key": "mit"}, "forks": 3},
+            {"name": "b", "license": None},
+            MappingProxyType({"name": "c", "license": {"key": "bsd"}}),
+        ])
+        self.assertEqual(
+            extract_columns(records, [("name",), ("license", "key"),
+                                      ("forks",)], fill=-1),
+            [["a", "b", "c"], ["mit", -1, "bsd"], [3, -1, -1]],
+        )
+
+    def test_no_records(self):
+        """
+        Test that empty input yields empty columns.
+        """
+        self.assertEqual(extract_columns([], [("a",), ("b",)]), [[], []])
+
+
+class TestProjection(unittest.TestCase):
+    """
+    Contains tests for project and get_json(projection=...).
+    """
+
+    REPOS = [
+        {"name": "a", "license": {"key": "mit", "url": "u"}, "forks": 1},
+        {"name": "b", "license": None, "owner": {"login": "g", "id": 2}},
+    ]
+
+    def test_project(self):
+        """
+        Test that only the requested paths survive.
+        """
+        self.assertEqual(
+            project(self.REPOS, ["name", ("license", "key"), "owner"]),
+            [{"name": "a", "license": {"key": "mit"}},
+             {"name": "b", "license": None,
+              "owner": {"login": "g", "id": 2}}],
+        )
+        self.assertEqual(project({"a": {"b": 1, "c": 2}}, ["a.b", "a"]),
+                         {"a": {"b": 1, "c": 2}})
+
+    def test_get_json_projection(self):
+        """
+        Test that projected and full bodies are decoded and cached apart.
+        """
+        validator_cache.clear()
+        self.addCleanup(validator_cache.clear)
+        server = start_json_server({"/repos": self.REPOS})
+        server.etags["/repos"] = '"v1"'
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = server.url + "/repos"
+        self.assertEqual(get_json(url, projection=["name"]),
+                         [{"name": "a"}, {"name": "b"}])
+        self.assertEqual(get_json(url), self.REPOS)
+        self.assertEqual(get_json(url, projection=["name"]),
+                         [{"name": "a"}, {"name": "b"}])
+        self.assertEqual(len(validator_cache), 2)
+
+    @parameterized.expand([
+        (b' [ ] ', []),
+        (b'{"name": "a", "id": 1}', {"name": "a"}),
+        (b'[{"name": "a"} , 1,"x" ]\n', [{"name": "a"}, 1, "x"]),
+    ])
+    def test_decode_projected(self, content, expected):
+        """
+        Test element-wise decoding of arrays and plain documents.
+        """
+        self.assertEqual(utils._decode_projected(content, {"name": None}),
+                         expected)
+
+    @parameterized.expand([
+        (b'[{"name": "a"} {"name": "b"}]',),
+        (b'[1, 2] 3',),
+        (b'[1, 2',),
+    ])
+    def test_decode_projected_errors(self, content):
+        """
+        Test that malformed arrays raise JSONDecodeError.
+        """
+        with self.assertRaises(json.JSONDecodeError):
+            utils._decode_projected(content, {"name": None})
+
+
+class TestIterJsonArray(unittest.TestCase):
+    """
+    Contains tests for the incremental array decoder.
+    """
+
+    DOCUMENT = json.dumps([
+        {"name": "épisodes", "forks": 22, "license": None},
+        -1.5e3, 12345, "a,]b", [], True, None, {"nested": [1, {"x": 2}]},
+    ], ensure_ascii=False).encode()
+
+    @parameterized.expand([(1,), (3,), (7,), (4096,)])
+    def test_any_chunk_size(self, size):
+        """
+        Test that splitting the bytes anywhere decodes the same elements.
+        """
+        chunks = [self.DOCUMENT[i:i + size]
+                  for i in range(0, len(self.DOCUMENT), size)]
+        self.assertEqual(list(iter_json_array(chunks)),
+                         json.loads(self.DOCUMENT))
+
+    def test_elements_yielded_before_end_of_input(self):
+        """
+        Test that an element is yielded as soon as it is complete.
+        """
+        received = []
+
+        def chunks():
+            for chunk in (b'[{"name": "a"}', b', {"name": "b"}', b"]"):
+                received.append(chunk)
+                yield chunk
+
+        items = iter_json_array(chunks(), projection=["name"])
+        self.assertEqual(next(items), {"name": "a"})
+        self.assertEqual(len(received), 1)
+        self.assertEqual(list(items), [{"name": "b"}])
+
+    @parameterized.expand([
+        (b'{"a": 1}',),
+        (b'[1, 2',),
+        (b'[1 2]',),
+        (b'[1,]',),
+        (b'[1] x',),
+    ])
+    def test_errors(self, content):
+        """
+        Test that malformed or non-array documents raise.
+        """
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array([content[:3], content[3:]]))
+
+    def test_iter_json_items(self):
+        """
+        Test that items are streamed across paginated responses.
+        """
+        server = start_json_server(
+            {"/repos": [{"name": "a", "id": 1}], "/repos?page=2": [2]},
+            {"/repos": {"Link": '<{url}/repos?page=2>; rel="next"'}},
+        )
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.assertEqual(
+            list(iter_json_items(server.url + "/repos", ["name"])),
+            [{"name": "a"}, 2],
+        )
+
+
+class TestStreamedPages(unittest.TestCase):
+    """
+    Contains tests for the caching and coalescing of streamed pages.
+    """
+
+    def setUp(self):
+        validator_cache.clear()
+        self.repos = [{"name": "repo{}".format(i)} for i in range(50)]
+        self.server = start_json_server({"/repos": self.repos})
+        self.url = self.server.url + "/repos"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_revalidated(self):
+        """
+        Test that a streamed page is revalidated and replayed on 304.
+
+        Asserts:
+            The second stream sends If-None-Match and yields the same
+            elements from validator_cache.
+        """
+        self.server.etags["/repos"] = '"v1"'
+        self.assertEqual(list(iter_json_items(self.url)), self.repos)
+        self.assertEqual(list(iter_json_items(self.url)), self.repos)
+        self.assertEqual(self.server.requests[1]["If-None-Match"], '"v1"')
+
+    def test_disk_cache(self):
+        """
+        Test that a streamed page is replayed from the disk cache.
+        """
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        configure_disk_cache(tmp.name)
+        self.addCleanup(configure_disk_cache, None)
+        self.assertEqual(list(iter_json_items(self.url)), self.repos)
+        self.assertEqual(list(iter_json_items(self.url)), self.repos)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_coalesced(self):
+        """
+        Test that concurrent streams of a page share one request.
+
+        Asserts:
+            A stream started while another is reading the page waits for
+            it and replays its elements; a nested stream in the same
+            thread fetches the page itself instead of deadlocking.
+        """
+        before = request_coalescer.stats()["coalesced"]
+        leader = iter_json_items(self.url)
+        self.assertEqual(next(leader), self.repos[0])
+        replayed = []
+        follower = threading.Thread(
+            target=lambda: replayed.extend(iter_json_items(self.url)))
+        follower.start()
+        deadline = time.monotonic() + 5
+        while request_coalescer.stats()["coalesced"] == before and \
+                time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(list(iter_json_items(self.url)), self.repos)
+        self.assertEqual(list(leader), self.repos[1:])
+        follower.join(5)
+        self.assertEqual(replayed, self.repos)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_fetch_while_leading(self):
+        """
+        Test that a thread streaming a page can fetch it whole meanwhile.
+
+        Asserts:
+            get_json for the page being streamed returns instead of
+            waiting for the stream its own thread leads, and the stream
+            then completes.
+        """
+        def read():
+            for repo in iter_json_items(self.url):
+                if not fetched:
+                    fetched.append(get_json(self.url))
+                streamed.append(repo)
+
+        fetched, streamed = [], []
+        reader = threading.Thread(target=read, daemon=True)
+        reader.start()
+        reader.join(5)
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(streamed, self.repos)
+        self.assertEqual(fetched[0], self.repos)
+
+    def test_fetch_after_closed_leader(self):
+        """
+        Test that fetches waiting for a stream closed early fetch.
+
+        Asserts:
+            get_json waiting for a stream that is closed after one item
+            returns the whole page.
+        """
+        before = request_coalescer.stats()["coalesced"]
+        leader = iter_json_items(self.url)
+        next(leader)
+        fetched = []
+        follower = threading.Thread(
+            target=lambda: fetched.append(get_json(self.url)))
+        follower.start()
+        deadline = time.monotonic() + 5
+        while request_coalescer.stats()["coalesced"] == before and \
+                time.monotonic() < deadline:
+            time.sleep(0.01)
+        leader.close()
+        follower.join(5)
+        self.assertEqual(fetched, [self.repos])
+
+    def test_closed_leader(self):
+        """
+        Test that closing a leading stream lets waiting ones fetch.
+        """
+        leader = iter_json_items(self.url)
+        next(leader)
+        replayed = []
+        follower = threading.Thread(
+            target=lambda: replayed.extend(iter_json_items(self.url)))
+        follower.start()
+        time.sleep(0.05)
+        leader.close()
+        follower.join(5)
+        self.assertEqual(replayed, self.repos)
+
+
+class TestRateLimiter(unittest.TestCase):
+    """
+    Contains tests for the shared rate-limit scheduler.
+    """
+
+    def test_waits_for_reset_when_exhausted(self):
+        """
+        Test that an exhausted budget holds requests until the reset.
+        """
+        limiter = RateLimiter()
+        limiter.acquire()
+        limiter.release(200, {"X-RateLimit-Remaining": "0",
+                              "X-RateLimit-Reset": str(time.time() + 0.2)})
+        self.assertEqual(limiter.remaining, 0)
+        start = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+    def test_retry_after_backs_off_with_jitter(self):
+        """
+        Test that a 429 is reported as limited and pauses new requests.
+        """
+        limiter = RateLimiter(jitter=0.5)
+        limiter.acquire()
+        self.assertTrue(limiter.release(429, {"Retry-After": "0.1"}))
+        self.assertGreaterEqual(limiter._blocked_until - time.time(), 0.09)
+        self.assertLessEqual(limiter._blocked_until - time.time(), 0.15)
+        limiter.acquire()
+        self.assertFalse(limiter.release(200, {}))
+        self.assertFalse(limiter.release(403, {}))
+
+    def test_high_priority_goes_first(self):
+        """
+        Test that waiting requests are admitted by priority.
+        """
+        limiter = RateLimiter()
+        limiter._blocked_until = time.time() + 0.2
+        admitted = []
+
+        def request(priority, name):
+            limiter.acquire(priority)
+            admitted.append(name)
+            limiter.release(200, {})
+
+        threads = [threading.Thread(target=request, args=(PRIORITY_LOW,
+                                                          "bulk"))]
+        threads[0].start()
+        time.sleep(0.05)
+        threads.append(threading.Thread(target=request,
+                                        args=(PRIORITY_HIGH, "interactive")))
+        threads[1].start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(admitted, ["interactive", "bulk"])
+
+    def test_acquire_async(self):
+        """
+        Test that tasks wait on the same budget without blocking the loop.
+        """
+        limiter = RateLimiter()
+        limiter._blocked_until = time.time() + 0.1
+
+        async def main():
+            start = time.monotonic()
+            await asyncio.gather(limiter.acquire_async(),
+                                 asyncio.sleep(0.01))
+            return time.monotonic() - start
+
+        self.assertGreaterEqual(asyncio.run(main()), 0.05)
+
+    def test_get_json_retries_rate_limited_request(self):
+        """
+        Test that get_json waits out a 429 and retries the request.
+        """
+        limited = Mock(status_code=429, headers={"Retry-After": "0"})
+        ok = body_response(b'{"payload": true}', status_code=200,
+                           headers={}, links={})
+        with patch("utils.rate_limiter", RateLimiter()), \
+                patch("requests.Session.get",
+                      side_effect=[limited, ok]) as mock_get:
+            with request_priority(PRIORITY_HIGH):
+                self.assertEqual(get_json("http://example.com/rl"),
+                                 {"payload": True})
+        self.assertEqual(mock_get.call_count, 2)
+
+
+class TestRequestCoalescing(unittest.TestCase):
+    """
+    Contains tests for in-flight request coalescing.
+    """
+
+    def setUp(self):
+        validator_cache.clear()
+        self.release = threading.Event()
+        self.response = body_response(b'{"login": "google"}',
+                                      status_code=200, headers={}, links={})
+
+    def slow_get(self, url, **kwargs):
+        """Session.get stand-in that waits for the test to release it."""
+        self.release.wait(5)
+        return self.response
+
+    def test_threads_share_one_request(self):
+        """
+        Test that concurrent threads asking for one URL make one request.
+        """
+        before = request_coalescer.stats()
+        results = []
+
+        def read():
+            results.append(get_json("http://example.com/coalesce"))
+
+        with patch("requests.Session.get",
+                   side_effect=self.slow_get) as mock_get:
+            threads = [threading.Thread(target=read) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.1)
+            self.release.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        after = request_coalescer.stats()
+        self.assertEqual(after["started"] - before["started"], 1)
+        self.assertEqual(after["coalesced"] - before["coalesced"], 4)
+
+    def test_task_joins_thread_request(self):
+        """
+        Test that an asyncio caller attaches to a thread's request.
+        """
+        results = []
+        with patch("requests.Session.get",
+                   side_effect=self.slow_get) as mock_get:
+            thread = threading.Thread(target=lambda: results.append(
+                get_json("http://example.com/shared")))
+            thread.start()
+            time.sleep(0.05)
+
+            async def main():
+                asyncio.get_running_loop().call_later(0.05, self.release.set)
+                return await get_json_async("http://example.com/shared")
+
+            self.assertEqual(asyncio.run(main()), {"login": "google"})
+            thread.join()
+        self.assertEqual(results, [{"login": "google"}])
+        mock_get.assert_called_once()
+
+    def test_errors_are_shared(self):
+        """
+        Test that a failing call fails every waiter and is not kept.
+        """
+        coalescer = RequestCoalescer()
+        with self.assertRaises(ValueError):
+            coalescer.run("key", Mock(side_effect=ValueError))
+        self.assertEqual(coalescer.run("key", lambda: 1), 1)
+        self.assertEqual(coalescer.stats(), {"started": 2, "coalesced": 0})
+
+
+class TestSharedMemoCache(unittest.TestCase):
+    """
+    Contains tests for LRUCache and memoize's shared backend.
+    """
+
+    def make_class(self, backend):
+        """Return a class keyed by its ``key`` argument, counting calls."""
+        counter = iter(range(100))
+
+        class TestClass:
+            memo_backend = backend
+
+            def __init__(self, key):
+                self.key = key
+
+            def _memo_key(self):
+                return self.key
+
+            @memoize
+            def a_property(self):
+                return next(counter)
+
+        return TestClass
+
+    def test_lru_cache_evicts_least_recently_used(self):
+        """
+        Test that the cache keeps its most recently used keys.
+        """
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn("b", cache)
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+        self.assertEqual(cache.pop("a"), 1)
+        self.assertIsNone(cache.get("a"))
+
+    def test_instances_share_values(self):
+        """
+        Test that instances with the same key reuse each other's value.
+        """
+        TestClass = self.make_class(LRUCache())
+        self.assertEqual(TestClass("x").a_property, 0)
+        self.assertEqual(TestClass("x").a_property, 0)
+        self.assertEqual(TestClass("y").a_property, 1)
+
+    def test_invalidate_drops_shared_value(self):
+        """
+        Test that invalidating also removes the value from the backend.
+        """
+        TestClass = self.make_class(LRUCache())
+        first = TestClass("x")
+        first.a_property
+        invalidate_memoized(first)
+        self.assertEqual(TestClass("x").a_property, 1)
+        self.assertEqual(first.a_property, 1)
+
+    def test_backend_is_bounded(self):
+        """
+        Test that evicted keys are computed again.
+        """
+        TestClass = self.make_class(LRUCache(1))
+        TestClass("x").a_property
+        TestClass("y").a_property
+        self.assertEqual(TestClass("x").a_property, 2)
+
+
+class TestCompression(unittest.TestCase):
+    """
+    Contains tests for compressed transfers and their byte counts.
+    """
+
+    def setUp(self):
+        validator_cache.clear()
+        self.payload = [{"name": "repo{}".format(i),
+                         "hooks_url": "https://api.github.com/hooks"}
+                        for i in range(200)]
+        self.body_size = len(json.dumps(self.payload).encode())
+        self.server = start_json_server({"/repos": self.payload})
+        self.server.compress = True
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_fetch_json_reports_sizes(self):
+        """
+        Test that gzip is negotiated and both sizes are reported.
+
+        Asserts:
+            The request offers gzip, the payload is decoded, the result
+            carries the compressed and decoded sizes and the totals of
+            transfer_stats grow by the same amounts.
+        """
+        before = transfer_stats()
+        response = fetch_json(self.server.url + "/repos")
+        after = transfer_stats()
+        self.assertIn("gzip", self.server.requests[0]["Accept-Encoding"])
+        self.assertEqual(response.payload, self.payload)
+        self.assertEqual(response.body_bytes, self.body_size)
+        self.assertGreater(response.wire_bytes, 0)
+        self.assertLess(response.wire_bytes, self.body_size // 4)
+        self.assertEqual(after["responses"] - before["responses"], 1)
+        self.assertEqual(after["wire_bytes"] - before["wire_bytes"],
+                         response.wire_bytes)
+        self.assertEqual(after["body_bytes"] - before["body_bytes"],
+                         self.body_size)
+
+    def test_streamed_items_are_counted(self):
+        """
+        Test that streamed pages are inflated and counted.
+        """
+        before = transfer_stats()
+        items = list(iter_json_items(self.server.url + "/repos", ["name"]))
+        after = transfer_stats()
+        self.assertEqual(items, [{"name": repo["name"]}
+                                 for repo in self.payload])
+        self.assertEqual(after["body_bytes"] - before["body_bytes"],
+                         self.body_size)
+        wire_bytes = after["wire_bytes"] - before["wire_bytes"]
+        self.assertGreater(wire_bytes, 0)
+        self.assertLess(wire_bytes, self.body_size // 4)
+
+    @parameterized.expand([
+        ("gzip", gzip.compress),
+        ("deflate", zlib.compress),
+        ("identity", bytes),
+    ])
+    def test_content_codings(self, coding, compress):
+        """
+        Test that every offered coding is inflated and counted.
+        """
+        body = json.dumps(self.payload).encode()
+        wire = compress(body)
+        response = body_response(wire, status_code=200, links={},
+                                 headers={"Content-Encoding": coding})
+        with patch("requests.Session.get", return_value=response):
+            result = fetch_json("http://example.com/" + coding)
+        self.assertEqual(result.payload, self.payload)
+        self.assertEqual((result.wire_bytes, result.body_bytes),
+                         (len(wire), len(body)))
+
+    def test_chunked_sizes(self):
+        """
+        Test that chunked responses are counted as well.
+
+        Asserts:
+            Compressed, chunked bodies report a wire size above 0 and
+            below the decoded size, both fetched whole and streamed;
+            the uncompressed chunked body reports its full size.
+        """
+        self.server.chunked = True
+        url = self.server.url + "/repos"
+        response = fetch_json(url)
+        self.assertEqual(response.payload, self.payload)
+        self.assertEqual(response.body_bytes, self.body_size)
+        self.assertGreater(response.wire_bytes, 0)
+        self.assertLess(response.wire_bytes, self.body_size // 4)
+        before = transfer_stats()
+        self.assertEqual(len(list(iter_json_items(url))), len(self.payload))
+        after = transfer_stats()
+        self.assertEqual(after["wire_bytes"] - before["wire_bytes"],
+                         response.wire_bytes)
+        self.server.compress = False
+        validator_cache.clear()
+        response = fetch_json(url)
+        self.assertEqual(response.wire_bytes, self.body_size)
+        self.assertEqual(response.body_bytes, self.body_size)
+
+    def test_async_sizes(self):
+        """
+        Test that the async path reports the same sizes.
+        """
+
+        async def fetch():
+            try:
+                return await fetch_json_async(self.server.url + "/repos")
+            finally:
+                await close_async_session()
+
+        response = asyncio.run(fetch())
+        self.assertEqual(response.payload, self.payload)
+        self.assertEqual(response.body_bytes, self.body_size)
+        self.assertGreater(response.wire_bytes, 0)
+        self.assertLess(response.wire_bytes, self.body_size // 4)
+
+
+class TestJsonDecoder(unittest.TestCase):
+    """
+    Contains tests for the pluggable JSON decoders.
+    """
+
+    def tearDown(self):
+        configure_json_decoder()
+
+    def test_backends_agree(self):
+        """
+        Test that every backend decodes documents to the same values,
+        including the ones orjson hands back to the standard library.
+        """
+        documents = [
+            json.dumps(TEST_PAYLOAD).encode(),
+            '{"name": "café", "n": 1.5e300}'.encode(),
+            b'[NaN, Infinity, 123456789012345678901234567890]',
+            b'123456789012345678901234567890',
+            b'{"low": -9223372036854775809, "high": 18446744073709551616}',
+            b'[-9223372036854775808, 18446744073709551615, 1.5e19]',
+            '{"utf16": true}'.encode("utf-16"),
+        ]
+        for document in documents:
+            expected = repr(json.loads(document))
+            for name, decoder in utils.JSON_DECODERS.items():
+                with self.subTest(decoder=name):
+                    self.assertEqual(repr(decoder(document)), expected)
+
+    @unittest.skipIf(utils.orjson is None, "orjson is not installed")
+    def test_default_is_faster(self):
+        """
+        Test that the default backend beats the standard library.
+
+        Asserts:
+            Decoding a 2 MB repos payload with decode_json takes less
+            time than json.loads, best of ten alternating runs each with
+            the garbage collector paused.
+        """
+        document = json.dumps(TEST_PAYLOAD[0][1] * 40).encode()
+        best = {decode_json: float("inf"), json.loads: float("inf")}
+        gc.disable()
+        try:
+            for _ in range(10):
+                for decode in best:
+                    start = time.perf_counter()
+                    decode(document)
+                    best[decode] = min(best[decode],
+                                       time.perf_counter() - start)
+        finally:
+            gc.enable()
+        self.assertLess(best[decode_json], best[json.loads])
+
+    def test_configure_json_decoder(self):
+        """
+        Test that get_json decodes with the configured backend.
+        """
+        decoder = Mock(return_value={"decoded": True})
+        self.assertIs(configure_json_decoder(decoder), decoder)
+        response = body_response(b"{}", status_code=200, headers={},
+                                 links={})
+        with patch("requests.Session.get", return_value=response):
+            self.assertEqual(get_json("http://example.com/decoder"),
+                             {"decoded": True})
+        decoder.assert_called_once_with(b"{}")
+        self.assertIs(configure_json_decoder("json"),
+                      utils.JSON_DECODERS["json"])
+        with self.assertRaises(ValueError):
+            configure_json_decoder("simdjson")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,22 +1,122 @@
 #!/usr/bin/env python3
 """Generic utilities for github org client.
 """
+import asyncio
+import codecs
+import contextvars
+import hashlib
+import heapq
+import itertools
+import json
+import marshal
+import os
+import random
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+import weakref
+import zlib
 import requests
-from functools import wraps
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, partial, wraps
+from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
 from typing import (
     Mapping,
     Sequence,
     Any,
+    AsyncIterator,
+    Awaitable,
     Dict,
+    Generator,
+    Hashable,
     Callable,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
 )
 
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - only needed by the async helpers
+    aiohttp = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - json is used instead
+    orjson = None
+
 __all__ = [
+    "DiskCache",
+    "LRUCache",
+    "PRIORITY_HIGH",
+    "PRIORITY_LOW",
+    "PRIORITY_NORMAL",
+    "RateLimiter",
+    "RequestCoalescer",
+    "ValidatorCache",
     "access_nested_map",
+    "async_memoize",
+    "close_async_session",
+    "compile_path",
+    "configure_disk_cache",
+    "configure_json_decoder",
+    "configure_session",
+    "connection_stats",
+    "decode_json",
+    "extract_columns",
+    "fetch_json",
+    "fetch_json_async",
+    "get_async_session",
     "get_json",
+    "get_json_async",
+    "get_session",
+    "invalidate_memoized",
+    "iter_json_array",
+    "iter_json_items",
+    "iter_json_pages",
+    "iter_json_pages_async",
     "memoize",
+    "project",
+    "rate_limiter",
+    "request_coalescer",
+    "request_priority",
+    "shared_memo_cache",
+    "transfer_stats",
+    "update_memoized",
+    "validator_cache",
+    "with_query",
 ]
 
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_ASYNC_CONNECTIONS = 100
+STREAM_CHUNK_SIZE = 64 * 1024
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+RATE_LIMIT_RETRIES = 3
+DEFAULT_VALIDATOR_CACHE_SIZE = 1024
+DEFAULT_DISK_CACHE_TTL = 300.0
+DEFAULT_DISK_CACHE_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MEMO_CACHE_SIZE = 256
+# The content codings `_iter_body` inflates with zlib, whose header
+# detection reads both gzip and zlib-wrapped deflate streams.
+ACCEPT_ENCODING = "gzip,deflate"
+_ZLIB_CODINGS = frozenset(("gzip", "x-gzip", "deflate"))
+
 
 def access_nested_map(nested_map: Mapping, path: Sequence) -> Any:
     """Access nested map with key path.
@@ -32,23 +132,1595 @@ def access_nested_map(nested_map: Mapping, path: Sequence) -> Any:
     >>> access_nested_map(nested_map, ["a", "b", "c"])
     1
     """
-    for key in path:
-        if not isinstance(nested_map, Mapping):
-            raise KeyError(key)
-        nested_map = nested_map[key]
+    return compile_path(path)(nested_map)
+
+
+def _accessor(path: Tuple) -> Callable[[Mapping], Any]:
+    """Build the accessor for a tuple of keys."""
+
+    def access(nested_map: Mapping) -> Any:
+        """Follow the compiled path through ``nested_map``."""
+        for key in path:
+            if type(nested_map) is not dict and \
+                    not isinstance(nested_map, Mapping):
+                raise KeyError(key)
+            nested_map = nested_map[key]
+        return nested_map
+
+    access.path = path
+    return access
+
+
+_cached_accessor = lru_cache(maxsize=1024)(_accessor)
+
+
+def compile_path(path: Sequence) -> Callable[[Mapping], Any]:
+    """Compile a key path into a reusable accessor.
+    The accessor behaves like `access_nested_map` with ``path`` fixed,
+    including the KeyError raised for a missing key or a non-mapping
+    value, but only falls back to the ``Mapping`` ABC check for values
+    that are not plain dicts. Accessors are cached by path.
+    Parameters
+    ----------
+    path: Sequence
+        a sequence of key representing a path to the value
+    Example
+    -------
+    >>> license_key = compile_path(("license", "key"))
+    >>> license_key({"license": {"key": "mit"}})
+    'mit'
+    """
+    path = tuple(path)
+    try:
+        return _cached_accessor(path)
+    except TypeError:
+        return _accessor(path)
+
+
+_MISSING = object()
+
+
+def _column_getter(path: Tuple, fill: Any) -> Callable[[Any], Any]:
+    """Build a getter returning ``fill`` where `compile_path` would raise.
+    Misses on plain dicts are detected with ``dict.get`` so no exception
+    is raised per missing value.
+    """
+
+    def get(record: Any) -> Any:
+        """Value at the path in ``record``, or the fill value."""
+        for key in path:
+            if type(record) is dict:
+                record = record.get(key, _MISSING)
+                if record is _MISSING:
+                    return fill
+            elif isinstance(record, Mapping):
+                try:
+                    record = record[key]
+                except KeyError:
+                    return fill
+            else:
+                return fill
+        return record
+
+    return get
+
+
+def extract_columns(
+    records: Iterable[Mapping],
+    paths: Sequence[Sequence],
+    fill: Any = None,
+) -> List[List[Any]]:
+    """Pull several key paths out of many records in a single pass.
+    Parameters
+    ----------
+    records: Iterable[Mapping]
+        the nested records, consumed once
+    paths: Sequence[Sequence]
+        key paths, as accepted by `access_nested_map`
+    fill: Any
+        value used where a path is missing from a record
+    Returns one list per path, each as long as ``records``.
+    Example
+    -------
+    >>> repos = [{"name": "a", "license": {"key": "mit"}}, {"name": "b"}]
+    >>> extract_columns(repos, [("name",), ("license", "key")])
+    [['a', 'b'], ['mit', None]]
+    """
+    columns: List[List[Any]] = [[] for _ in paths]
+    getters = [
+        (column.append, _column_getter(tuple(path), fill))
+        for column, path in zip(columns, paths)
+    ]
+    for record in records:
+        for append, get in getters:
+            append(get(record))
+    return columns
+
+
+class _ConnectionStats:
+    """Thread-safe counters for the pooled HTTP session."""
+
+    def __init__(self) -> None:
+        """Start both counters at zero."""
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.sent = 0
+
+    def record_opened(self) -> None:
+        """Count a freshly opened TCP (+TLS) connection."""
+        with self._lock:
+            self.opened += 1
+
+    def record_sent(self) -> None:
+        """Count a request handed to the connection pool."""
+        with self._lock:
+            self.sent += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        """Return the opened/reused counts."""
+        with self._lock:
+            return {
+                "opened": self.opened,
+                "reused": max(self.sent - self.opened, 0),
+            }
+
+
+_connection_stats = _ConnectionStats()
+
+
+class _TransferStats:
+    """Thread-safe totals of response body bytes, on the wire and decoded.
+    """
+
+    def __init__(self) -> None:
+        """Start every total at zero."""
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.wire_bytes = 0
+        self.body_bytes = 0
+
+    def record(self, wire_bytes: int, body_bytes: int) -> None:
+        """Count one response body."""
+        with self._lock:
+            self.responses += 1
+            self.wire_bytes += wire_bytes
+            self.body_bytes += body_bytes
+
+    def snapshot(self) -> Dict[str, int]:
+        """Return the response count and byte totals."""
+        with self._lock:
+            return {
+                "responses": self.responses,
+                "wire_bytes": self.wire_bytes,
+                "body_bytes": self.body_bytes,
+            }
+
+
+_transfer_stats = _TransferStats()
+
+
+class _CountingConnectionMixin:
+    """Count every socket actually opened by a pooled connection."""
+
+    def connect(self) -> None:
+        """Open the socket and record it."""
+        _connection_stats.record_opened()
+        super().connect()
+
+
+class _CountingHTTPConnection(_CountingConnectionMixin, HTTPConnection):
+    """HTTP connection that reports opens."""
+
+
+class _CountingHTTPSConnection(_CountingConnectionMixin, HTTPSConnection):
+    """HTTPS connection that reports opens."""
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    """HTTP pool handing out counting connections."""
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    """HTTPS pool handing out counting connections."""
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """Keep-alive adapter that publishes connection counters.
+    Connections are kept per host in pools of ``pool_maxsize`` and shared
+    by every thread using the session.
+    """
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        """Install the counting pool classes."""
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request: requests.PreparedRequest,
+             **kwargs: Any) -> requests.Response:
+        """Send the request through the pool and count it."""
+        _connection_stats.record_sent()
+        return super().send(request, **kwargs)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _build_session(pool_connections: int,
+                   pool_maxsize: int) -> requests.Session:
+    """Create a session whose adapters keep connections alive."""
+    session = requests.Session()
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    adapter = PooledHTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def configure_session(
+    pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+) -> requests.Session:
+    """(Re)build the shared session used by `get_json`.
+    Parameters
+    ----------
+    pool_connections: int
+        number of per-host pools to keep
+    pool_maxsize: int
+        maximum number of keep-alive connections kept per host
+    """
+    global _session
+    session = _build_session(pool_connections, pool_maxsize)
+    with _session_lock:
+        previous, _session = _session, session
+    if previous is not None:
+        previous.close()
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled session, creating it on first use.
+    """
+    global _session
+    session = _session
+    if session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session(DEFAULT_POOL_CONNECTIONS,
+                                          DEFAULT_POOL_MAXSIZE)
+            session = _session
+    return session
+
+
+def connection_stats() -> Dict[str, int]:
+    """Return how many pooled connections were opened and reused.
+    Example
+    -------
+    >>> connection_stats()
+    {'opened': 1, 'reused': 4}
+    """
+    return _connection_stats.snapshot()
+
+
+def transfer_stats() -> Dict[str, int]:
+    """Return how many response bodies were read and their total size as
+    transferred (``wire_bytes``, still compressed) and once decoded
+    (``body_bytes``).
+    Example
+    -------
+    >>> transfer_stats()
+    {'responses': 3, 'wire_bytes': 5120, 'body_bytes': 61440}
+    """
+    return _transfer_stats.snapshot()
+
+
+def _header_number(headers: Optional[Mapping], name: str) -> Optional[float]:
+    """Numeric value of a response header, or None."""
+    if headers is None:
+        return None
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Request scheduler shared by every thread and task of the process.
+    It learns the remaining budget from ``X-RateLimit-Remaining`` and
+    ``X-RateLimit-Reset`` and admits requests accordingly: freely while
+    the budget is comfortable, spaced evenly until the reset once fewer
+    than ``pace_below`` requests are left, and not at all once only
+    ``reserve`` remain. A 429, or a 403 with an exhausted budget or a
+    ``Retry-After`` header, pauses everyone for that long (or for an
+    exponential backoff), plus up to ``jitter`` of random extra delay.
+    Waiting requests are admitted by priority (lower first), then in
+    arrival order.
+    Parameters
+    ----------
+    reserve: int
+        requests kept back from the budget
+    pace_below: int
+        budget under which requests are spread until the reset
+    max_backoff: float
+        cap in seconds of the exponential backoff
+    jitter: float
+        maximum extra delay, as a fraction of the backoff
+    """
+
+    def __init__(
+        self,
+        reserve: int = 0,
+        pace_below: int = 100,
+        max_backoff: float = 60.0,
+        jitter: float = 0.25,
+    ) -> None:
+        """Start with an unknown (unlimited) budget."""
+        self.reserve = reserve
+        self.pace_below = pace_below
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self._condition = threading.Condition()
+        self._queue: List[Tuple[int, int]] = []
+        self._tickets = itertools.count()
+        self._remaining: Optional[float] = None
+        self._reset_at = 0.0
+        self._blocked_until = 0.0
+        self._next_slot = 0.0
+        self._in_flight = 0
+        self._failures = 0
+
+    @property
+    def remaining(self) -> Optional[int]:
+        """Last known budget, None until a response reported one."""
+        return None if self._remaining is None else int(self._remaining)
+
+    def _enqueue(self, priority: int) -> Tuple[int, int]:
+        """Queue a ticket; the lock must be held."""
+        ticket = (priority, next(self._tickets))
+        heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def _dequeue(self, ticket: Tuple[int, int]) -> None:
+        """Drop an abandoned ticket; the lock must be held."""
+        if ticket in self._queue:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+            self._condition.notify_all()
+
+    def _try_admit(self, ticket: Tuple[int, int]) -> Optional[float]:
+        """Admit ``ticket`` and return 0, or return how long to wait.
+        None means the ticket is not first in line. The lock must be held.
+        """
+        if self._queue[0] != ticket:
+            return None
+        now = time.time()
+        wait = self._blocked_until - now
+        interval = 0.0
+        if self._remaining is not None and now < self._reset_at:
+            usable = self._remaining - self._in_flight - self.reserve
+            if usable <= 0:
+                wait = max(wait, self._reset_at - now)
+            elif usable <= self.pace_below:
+                wait = max(wait, self._next_slot - now)
+                interval = (self._reset_at - now) / usable
+        if wait > 0:
+            return wait
+        heapq.heappop(self._queue)
+        self._in_flight += 1
+        self._next_slot = max(now, self._next_slot) + interval
+        self._condition.notify_all()
+        return 0.0
+
+    def acquire(self, priority: int = PRIORITY_NORMAL) -> None:
+        """Block until a request of ``priority`` may be sent."""
+        with self._condition:
+            ticket = self._enqueue(priority)
+            try:
+                while True:
+                    wait = self._try_admit(ticket)
+                    if wait == 0:
+                        return
+                    self._condition.wait(wait)
+            except BaseException:
+                self._dequeue(ticket)
+                raise
+
+    async def acquire_async(self, priority: int = PRIORITY_NORMAL,
+                            poll: float = 0.05) -> None:
+        """Wait without blocking the event loop, then admit a request."""
+        with self._condition:
+            ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._try_admit(ticket)
+                if wait == 0:
+                    return
+                await asyncio.sleep(poll if wait is None else min(wait, poll))
+        except BaseException:
+            with self._condition:
+                self._dequeue(ticket)
+            raise
+
+    def release(self, status: Optional[int] = None,
+                headers: Optional[Mapping] = None) -> bool:
+        """Record the response of an admitted request.
+        Returns True when the request was rate limited and should be
+        retried once admitted again.
+        """
+        remaining = _header_number(headers, "X-RateLimit-Remaining")
+        reset_at = _header_number(headers, "X-RateLimit-Reset")
+        retry_after = _header_number(headers, "Retry-After")
+        with self._condition:
+            self._in_flight -= 1
+            now = time.time()
+            if remaining is not None:
+                self._remaining = remaining
+            if reset_at is not None:
+                self._reset_at = reset_at
+            limited = status == 429 or status == 403 and (
+                retry_after is not None or remaining == 0)
+            if limited:
+                if retry_after is not None:
+                    delay = retry_after
+                elif remaining == 0 and self._reset_at > now:
+                    delay = self._reset_at - now
+                else:
+                    delay = min(2.0 ** self._failures, self.max_backoff)
+                delay *= 1 + random.uniform(0, self.jitter)
+                self._blocked_until = max(self._blocked_until, now + delay)
+                self._failures += 1
+            elif status is not None:
+                self._failures = 0
+            self._condition.notify_all()
+        return limited
+
+
+rate_limiter = RateLimiter()
+_priority: contextvars.ContextVar = contextvars.ContextVar(
+    "request_priority", default=PRIORITY_NORMAL)
+
+
+@contextmanager
+def request_priority(priority: int) -> Iterator[None]:
+    """Run the requests made in the block at ``priority``.
+    The priority follows the current thread or asyncio task.
+    Example
+    -------
+    >>> with request_priority(PRIORITY_HIGH):
+    ...     GithubOrgClient("google").public_repos()
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _send(url: str, headers: Optional[Dict[str, str]] = None,
+          **kwargs: Any) -> requests.Response:
+    """GET ``url`` on the pooled session under the rate limiter."""
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        rate_limiter.acquire(_priority.get())
+        try:
+            response = get_session().get(url, headers=headers, **kwargs)
+        except BaseException:
+            rate_limiter.release()
+            raise
+        limited = rate_limiter.release(response.status_code,
+                                       response.headers)
+        if not limited or attempt == RATE_LIMIT_RETRIES:
+            return response
+        response.close()
+
+
+class JSONResponse(NamedTuple):
+    """Decoded JSON body along with the response metadata we use.
+    ``wire_bytes`` and ``body_bytes`` are the size of the body downloaded
+    by this call, as transferred and once decompressed; both are 0 when
+    no body was downloaded (cache hits and ``304 Not Modified``).
+    """
+    payload: Any
+    links: Dict[str, Dict[str, str]]
+    wire_bytes: int = 0
+    body_bytes: int = 0
+
+
+class _Validated(NamedTuple):
+    """HTTP validators of a response and the body they validate."""
+    etag: Optional[str]
+    last_modified: Optional[str]
+    response: JSONResponse
+
+
+class ValidatorCache:
+    """Bounded LRU of parsed JSON bodies keyed by URL, with the ``ETag``
+    and ``Last-Modified`` validators needed to revalidate them.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_VALIDATOR_CACHE_SIZE) -> None:
+        """Create an empty cache holding at most ``maxsize`` URLs."""
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, _Validated]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of cached URLs."""
+        return len(self._entries)
+
+    def get(self, url: str) -> Optional[_Validated]:
+        """Return the entry for ``url`` and mark it recently used."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+            return entry
+
+    def put(self, url: str, entry: _Validated) -> None:
+        """Store ``entry`` for ``url``, evicting the least recently used."""
+        with self._lock:
+            self._entries[url] = entry
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def conditional_headers(entry: Optional[_Validated]) -> Dict[str, str]:
+        """Request headers revalidating ``entry``."""
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+
+validator_cache = ValidatorCache()
+
+
+def _remember_validators(url: str, status: int, headers: Mapping,
+                         result: JSONResponse) -> None:
+    """Keep ``result`` in `validator_cache` if it can be revalidated."""
+    if status != 200:
+        return
+    etag = headers.get("ETag")
+    last_modified = headers.get("Last-Modified")
+    if etag or last_modified:
+        validator_cache.put(url, _Validated(etag, last_modified, result))
+
+
+class DiskCache:
+    """URL-keyed on-disk cache of decoded JSON responses.
+    Each URL is one file holding an expiry timestamp followed by the body
+    in `marshal` format, which loads several times faster than decoding
+    the original JSON text. Files are written to a temporary name and
+    renamed into place, so several processes can share one directory
+    without locking: readers see either the old or the new entry. Reads
+    bump the file's mtime and writes evict the least recently used files
+    once the directory grows past ``max_bytes``. The directory is only
+    scanned when a running estimate of its size crosses ``max_bytes``,
+    or at most every `_RESCAN_INTERVAL` seconds to pick up files written
+    by other processes.
+    Parameters
+    ----------
+    directory: str
+        directory holding the cache files, created if missing
+    ttl: float
+        default lifetime of an entry in seconds
+    max_bytes: int
+        size the directory is trimmed back to once it grows past it
+    """
+    _HEADER = struct.Struct("<4sBBd")
+    _MAGIC = b"GJDC"
+    _SUFFIX = ".bin"
+    _RESCAN_INTERVAL = 60.0
+
+    def __init__(
+        self,
+        directory: str,
+        ttl: float = DEFAULT_DISK_CACHE_TTL,
+        max_bytes: int = DEFAULT_DISK_CACHE_MAX_BYTES,
+    ) -> None:
+        """Open (or create) the cache directory."""
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None
+        self._scanned = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        """File holding the entry for ``url``."""
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + self._SUFFIX)
+
+    def get(self, url: str) -> Optional[JSONResponse]:
+        """Return the live entry for ``url``, or None."""
+        path = self._path(url)
+        try:
+            with open(path, "rb") as cache_file:
+                data = cache_file.read()
+        except OSError:
+            return None
+        if len(data) < self._HEADER.size:
+            return None
+        magic, major, minor, expires = self._HEADER.unpack_from(data)
+        if (magic, major, minor) != (self._MAGIC,) + sys.version_info[:2]:
+            return None
+        if expires <= time.time():
+            self._unlink(path)
+            return None
+        try:
+            payload, links = marshal.loads(data[self._HEADER.size:])
+        except (EOFError, ValueError, TypeError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return JSONResponse(payload, links)
+
+    def put(self, url: str, response: JSONResponse,
+            ttl: Optional[float] = None) -> None:
+        """Store ``response`` for ``url`` for ``ttl`` seconds."""
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        try:
+            body = marshal.dumps((response.payload, response.links))
+        except ValueError:
+            return
+        header = self._HEADER.pack(self._MAGIC, *sys.version_info[:2],
+                                   expires)
+        path = self._path(url)
+        try:
+            replaced = os.stat(path).st_size
+        except OSError:
+            replaced = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(header)
+                tmp_file.write(body)
+            os.replace(tmp_path, path)
+        except OSError:
+            self._unlink(tmp_path)
+            return
+        self._grow(len(header) + len(body) - replaced)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        for entry in self._entries():
+            self._unlink(entry.path)
+        with self._lock:
+            self._size = None
+
+    def _entries(self) -> List[os.DirEntry]:
+        """Cache files currently in the directory."""
+        with os.scandir(self.directory) as entries:
+            return [entry for entry in entries
+                    if entry.name.endswith(self._SUFFIX)]
+
+    def _grow(self, delta: int) -> None:
+        """Add ``delta`` bytes to the size estimate, evicting when it is
+        over ``max_bytes`` or due for a rescan.
+        """
+        with self._lock:
+            due = self._size is None or \
+                time.monotonic() - self._scanned >= self._RESCAN_INTERVAL
+            if not due:
+                self._size += delta
+                if self._size <= self.max_bytes:
+                    return
+        self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used files until under ``max_bytes``."""
+        sized = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            sized.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in sized)
+        for _, size, path in sorted(sized):
+            if total <= self.max_bytes:
+                break
+            self._unlink(path)
+            total -= size
+        with self._lock:
+            self._size = total
+            self._scanned = time.monotonic()
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        """Remove ``path``, ignoring files another process removed."""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_disk_cache: Optional[DiskCache] = None
+
+
+def configure_disk_cache(
+    directory: Optional[str],
+    ttl: float = DEFAULT_DISK_CACHE_TTL,
+    max_bytes: int = DEFAULT_DISK_CACHE_MAX_BYTES,
+) -> Optional[DiskCache]:
+    """Put a `DiskCache` in front of `get_json`, or remove it with None.
+    Example
+    -------
+    >>> configure_disk_cache("/var/cache/github", ttl=600)
+    """
+    global _disk_cache
+    _disk_cache = None if directory is None \
+        else DiskCache(directory, ttl, max_bytes)
+    return _disk_cache
+
+
+def _loads_json(data: bytes) -> Any:
+    """Decode with the standard library (UTF-8/16/32 bytes)."""
+    return json.loads(data)
+
+
+# Integer literals of 19 digits or more, the ones that may not fit the
+# 64 bits orjson decodes integers into.
+_LONG_INTEGER = re.compile(rb"(?<![\d.eE+-])-?(\d{19,})(?![\d.eE])")
+# Maps digits to "1" and every other byte to "0": a run of 19 digits is
+# then found by `bytes.find`, far faster than a regex over the document.
+_DIGIT_MASK = bytes(0x31 if 0x30 <= byte <= 0x39 else 0x30
+                    for byte in range(256))
+_DIGIT_RUN = b"1" * 19
+
+
+def _has_wide_integer(data: bytes) -> bool:
+    """Whether ``data`` holds an integer literal outside the range
+    orjson decodes exactly (it returns a float for those).
+    Only documents with 19 digits in a row are searched for literals.
+    """
+    if data.translate(_DIGIT_MASK).find(_DIGIT_RUN) < 0:
+        return False
+    for match in _LONG_INTEGER.finditer(data):
+        if not -2 ** 63 <= int(match.group()) < 2 ** 64:
+            return True
+    return False
+
+
+def _loads_orjson(data: bytes) -> Any:
+    """Decode with orjson, deferring to `json` for what it rejects.
+    orjson refuses some documents `json` accepts (NaN and Infinity,
+    non UTF-8 encodings) and turns integers beyond 64 bits into floats;
+    those go through the standard library so both backends return the
+    same values.
+    """
+    try:
+        value = orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return _loads_json(data)
+    if _has_wide_integer(data):
+        return _loads_json(data)
+    return value
+
+
+JSON_DECODERS: Dict[str, Callable[[bytes], Any]] = {"json": _loads_json}
+if orjson is not None:
+    JSON_DECODERS["orjson"] = _loads_orjson
+
+_json_decoder = JSON_DECODERS.get("orjson", _loads_json)
+
+
+def configure_json_decoder(
+    decoder: Union[str, Callable[[bytes], Any], None] = None,
+) -> Callable[[bytes], Any]:
+    """Choose how `get_json` decodes response bodies.
+    Parameters
+    ----------
+    decoder: str or Callable
+        name of a backend in `JSON_DECODERS`, a function decoding raw
+        bytes, or None for the fastest installed backend
+    Example
+    -------
+    >>> configure_json_decoder("json")
+    """
+    global _json_decoder
+    if decoder is None:
+        decoder = "orjson" if "orjson" in JSON_DECODERS else "json"
+    if isinstance(decoder, str):
+        try:
+            decoder = JSON_DECODERS[decoder]
+        except KeyError:
+            raise ValueError(
+                "unknown JSON decoder {!r}".format(decoder)) from None
+    _json_decoder = decoder
+    return decoder
+
+
+def decode_json(data: bytes) -> Any:
+    """Decode a JSON document from raw bytes with the configured backend.
+    Example
+    -------
+    >>> decode_json(b'{"a": 1}')
+    {'a': 1}
+    """
+    return _json_decoder(data)
+
+
+Projection = Optional[Iterable[Union[str, Sequence]]]
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+def _projection_tree(paths: Iterable[Union[str, Sequence]]) -> Dict:
+    """Merge key paths into a tree; None marks a value kept whole."""
+    tree: Dict = {}
+    for path in paths:
+        keys = path.split(".") if isinstance(path, str) else tuple(path)
+        node = tree
+        for depth, key in enumerate(keys):
+            if depth == len(keys) - 1:
+                node[key] = None
+            elif node.get(key, {}) is None:
+                break
+            else:
+                node = node.setdefault(key, {})
+    return tree
+
+
+def _project(value: Any, tree: Dict) -> Any:
+    """Apply a projection tree to a record or to each item of a list."""
+    if type(value) is list:
+        return [_project(item, tree) for item in value]
+    if type(value) is not dict and not isinstance(value, Mapping):
+        return value
+    return {
+        key: value[key] if subtree is None else _project(value[key], subtree)
+        for key, subtree in tree.items()
+        if key in value
+    }
+
+
+def project(value: Any, paths: Iterable[Union[str, Sequence]]) -> Any:
+    """Keep only the given key paths of a record, or of each record of a
+    list. Paths are key sequences or dotted strings; the value at the end
+    of a path is kept whole and non-mapping values on the way are kept
+    as they are.
+    Example
+    -------
+    >>> repos = [{"name": "a", "license": {"key": "mit", "url": "..."}}]
+    >>> project(repos, ["name", ("license", "key")])
+    [{'name': 'a', 'license': {'key': 'mit'}}]
+    """
+    return _project(value, _projection_tree(paths))
+
+
+def _skip_whitespace(text: str, index: int) -> int:
+    """Index of the first non-whitespace character from ``index``."""
+    return _WHITESPACE.match(text, index).end()
+
+
+class _JSONArrayParser:
+    """Incremental parser for the elements of a top-level JSON array.
+    Text is fed as it arrives; each element is decoded with the C
+    scanner as soon as it is complete and everything before it is
+    dropped from the buffer.
+    """
+    _START, _FIRST, _VALUE, _DELIMITER, _DONE = range(5)
+    _NUMBER_TAIL = frozenset("0123456789.eE+-")
+
+    def __init__(self) -> None:
+        """Start before the opening bracket."""
+        self._buffer = ""
+        self._state = self._START
+
+    def feed(self, text: str, final: bool = False) -> Iterator[Any]:
+        """Yield the elements completed by ``text``.
+        With ``final`` the input is known to end here, so incomplete
+        elements and a missing closing bracket are errors.
+        """
+        buffer = self._buffer + text
+        index = 0
+        state = self._state
+        while True:
+            index = _skip_whitespace(buffer, index)
+            if index == len(buffer):
+                break
+            char = buffer[index]
+            if state == self._START:
+                if char == "\ufeff":
+                    index += 1
+                    continue
+                if char != "[":
+                    raise json.JSONDecodeError("Expecting '['",
+                                               buffer, index)
+                index += 1
+                state = self._FIRST
+            elif state == self._FIRST and char == "]":
+                index += 1
+                state = self._DONE
+            elif state in (self._FIRST, self._VALUE):
+                try:
+                    item, end = _decoder.raw_decode(buffer, index)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break
+                if not final and type(item) in (int, float) and (
+                        end == len(buffer) or
+                        buffer[end] in self._NUMBER_TAIL):
+                    break
+                index = end
+                state = self._state = self._DELIMITER
+                yield item
+            elif state == self._DELIMITER:
+                if char not in ",]":
+                    raise json.JSONDecodeError("Expecting ',' delimiter",
+                                               buffer, index)
+                index += 1
+                state = self._VALUE if char == "," else self._DONE
+            else:
+                raise json.JSONDecodeError("Extra data", buffer, index)
+        self._state = state
+        self._buffer = buffer[index:]
+        if final and state != self._DONE:
+            raise json.JSONDecodeError("Unterminated array",
+                                       buffer, len(buffer))
 
-    return nested_map
 
+def iter_json_array(
+    chunks: Iterable[bytes],
+    projection: Projection = None,
+) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array from UTF-8 chunks.
+    Each element is yielded (projected, if asked) as soon as the chunks
+    received so far contain all of it, so the first element is available
+    before the last byte arrives and only about one chunk plus one
+    element is buffered at any time.
+    Parameters
+    ----------
+    chunks: Iterable[bytes]
+        the raw document, in pieces of any size
+    projection: Iterable
+        key paths kept from each element, see `project`
+    Example
+    -------
+    >>> list(iter_json_array([b'[{"a": 1}, ', b'{"a": 2}]']))
+    [{'a': 1}, {'a': 2}]
+    """
+    tree = None if projection is None else _projection_tree(projection)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parser = _JSONArrayParser()
+    for chunk in chunks:
+        for item in parser.feed(decoder.decode(chunk)):
+            yield item if tree is None else _project(item, tree)
+    for item in parser.feed(decoder.decode(b"", final=True), final=True):
+        yield item if tree is None else _project(item, tree)
+
+
+def _decode_projected(content: bytes, tree: Dict) -> Any:
+    """Decode a JSON document, projecting as it goes.
+    A top-level array is decoded one element at a time and each element
+    is projected before the next one is read, so the full records never
+    pile up; other documents are decoded and then projected.
+    """
+    text = content.decode("utf-8-sig")
+    if not text.startswith("[", _skip_whitespace(text, 0)):
+        return _project(json.loads(text), tree)
+    return [_project(item, tree)
+            for item in _JSONArrayParser().feed(text, final=True)]
+
+
+def _cache_key(url: str, tree: Optional[Dict]) -> str:
+    """Key under which a (possibly projected) body of ``url`` is cached."""
+    if tree is None:
+        return url
+    return "{}#projection={}".format(url, json.dumps(tree, sort_keys=True))
+
+
+# Published by a stream closed before its end: callers waiting for it
+# run their own call instead.
+_ABANDONED = object()
+
+
+class RequestCoalescer:
+    """Process-wide deduplication of identical in-flight calls.
+    The first caller for a key runs the call; callers arriving with the
+    same key before it finishes wait for it and get the same result (or
+    exception). Threads and asyncio tasks share in-flight calls both
+    ways: every call is published as a `concurrent.futures.Future`.
+    Streamed calls (see `stream`) stay in flight while their consumer
+    reads them, so a thread leading one runs its own calls for that key
+    instead of waiting for itself.
+    """
 
-def get_json(url: str) -> Dict:
+    def __init__(self) -> None:
+        """Start with nothing in flight."""
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, Future] = {}
+        self._started = 0
+        self._coalesced = 0
+        self._local = threading.local()
+
+    def _leading(self) -> set:
+        """Keys of the streams the current thread is leading."""
+        try:
+            return self._local.keys
+        except AttributeError:
+            keys = self._local.keys = set()
+            return keys
+
+    def _join(self, key: Any) -> Tuple[Future, bool]:
+        """Return the in-flight future for ``key`` and whether we lead."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._coalesced += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self._started += 1
+            return future, True
+
+    def _finish(self, key: Any, future: Future, result: Any = None,
+                error: Optional[BaseException] = None) -> None:
+        """Publish the outcome of a led call."""
+        with self._lock:
+            del self._calls[key]
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def run(self, key: Any, fn: Callable[[], Any]) -> Any:
+        """Return ``fn()``, sharing it with concurrent callers of ``key``."""
+        while True:
+            if key in self._leading():
+                return fn()
+            future, leader = self._join(key)
+            if leader:
+                break
+            result = future.result()
+            if result is not _ABANDONED:
+                return result
+        try:
+            result = fn()
+        except BaseException as error:
+            self._finish(key, future, error=error)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def run_async(self, key: Any,
+                        fn: Callable[[], Awaitable]) -> Any:
+        """Await ``fn()``, sharing it with concurrent callers of ``key``."""
+        while True:
+            if key in self._leading():
+                return await fn()
+            future, leader = self._join(key)
+            if leader:
+                break
+            result = await asyncio.shield(asyncio.wrap_future(future))
+            if result is not _ABANDONED:
+                return result
+        try:
+            result = await fn()
+        except BaseException as error:
+            self._finish(key, future, error=error)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def stream(
+        self,
+        key: Any,
+        fn: Callable[[], Generator[Any, None, Any]],
+    ) -> Generator[Any, None, Tuple[Any, bool]]:
+        """Yield from the generator ``fn()``, sharing the value it returns
+        with concurrent callers of ``key``.
+        Returns that value and True after streaming it, or the value of
+        the call already in flight and False without yielding anything.
+        A stream closed before its end shares nothing: its waiting
+        callers run their own call.
+        """
+        leading = self._leading()
+        while key not in leading:
+            future, leader = self._join(key)
+            if not leader:
+                result = future.result()
+                if result is not _ABANDONED:
+                    return result, False
+                continue
+            leading.add(key)
+            try:
+                result = yield from fn()
+            except GeneratorExit:
+                self._finish(key, future, _ABANDONED)
+                raise
+            except BaseException as error:
+                self._finish(key, future, error=error)
+                raise
+            finally:
+                leading.discard(key)
+            self._finish(key, future, result)
+            return result, True
+        result = yield from fn()
+        return result, True
+
+    def stats(self) -> Dict[str, int]:
+        """Calls actually made and calls that joined one in flight."""
+        with self._lock:
+            return {"started": self._started, "coalesced": self._coalesced}
+
+
+request_coalescer = RequestCoalescer()
+
+
+def fetch_json(url: str, projection: Projection = None) -> JSONResponse:
+    """Get JSON from remote URL, keeping the parsed Link header.
+    The request goes through the pooled keep-alive session so repeated
+    calls to the same host skip the TCP and TLS handshakes.
+    Responses carrying an ``ETag`` or ``Last-Modified`` header are kept in
+    `validator_cache` and revalidated with ``If-None-Match`` /
+    ``If-Modified-Since`` on the next call; on ``304 Not Modified`` the
+    previously parsed body is returned as is (the same object, so callers
+    must not mutate it).
+    When a disk cache is configured (see `configure_disk_cache`), live
+    entries are served from it without any request at all.
+    Every coding in `ACCEPT_ENCODING` is offered and the body is inflated
+    while it is read, then decoded from bytes by `decode_json` (see
+    `configure_json_decoder`); the result records its compressed and decoded
+    sizes, which are also summed in `transfer_stats`.
+    With a ``projection`` (key paths, see `project`) only those fields are
+    kept, and a top-level array is projected element by element while it
+    is decoded. Projected bodies are cached apart from full ones.
+    Concurrent calls for the same URL and projection, from threads or
+    from `fetch_json_async`, share a single request (see
+    `request_coalescer`).
+    """
+    tree = None if projection is None else _projection_tree(projection)
+    key = _cache_key(url, tree)
+    return request_coalescer.run(key, partial(_fetch_json, url, key, tree))
+
+
+def _fetch_json(url: str, key: str, tree: Optional[Dict]) -> JSONResponse:
+    """Uncoalesced body of `fetch_json`."""
+    disk_cache = _disk_cache
+    if disk_cache is not None:
+        stored = disk_cache.get(key)
+        if stored is not None:
+            return stored
+    cached = validator_cache.get(key)
+    response = _send(url, ValidatorCache.conditional_headers(cached),
+                     stream=True)
+    try:
+        if cached is not None and response.status_code == 304:
+            result = cached.response._replace(wire_bytes=0, body_bytes=0)
+        else:
+            sizes = [0, 0]
+            content = b"".join(_iter_body(response, sizes))
+            _transfer_stats.record(*sizes)
+            payload = decode_json(content) if tree is None \
+                else _decode_projected(content, tree)
+            result = JSONResponse(payload, response.links, *sizes)
+            _remember_validators(key, response.status_code,
+                                 response.headers, result)
+    finally:
+        response.close()
+    if disk_cache is not None and response.status_code in (200, 304):
+        disk_cache.put(key, result)
+    return result
+
+
+def get_json(url: str, projection: Projection = None) -> Dict:
     """Get JSON from remote URL.
     """
-    response = requests.get(url)
-    return response.json()
+    return fetch_json(url, projection).payload
+
+
+def _page_number(url: str) -> Optional[int]:
+    """Return the ``page`` query parameter of a URL, if any."""
+    pages = parse_qs(urlsplit(url).query).get("page")
+    try:
+        return int(pages[-1]) if pages else None
+    except ValueError:
+        return None
+
+
+def with_query(url: str, **params: Any) -> str:
+    """Return ``url`` with the given query parameters set.
+    Example
+    -------
+    >>> with_query("https://api.github.com/orgs/google/repos?page=2",
+    ...            sort="updated")
+    'https://api.github.com/orgs/google/repos?page=2&sort=updated'
+    """
+    parts = urlsplit(url)
+    query = parse_qs(parts.query, keep_blank_values=True)
+    for name, value in params.items():
+        query[name] = [str(value)]
+    return urlunsplit(parts._replace(query=urlencode(query, doseq=True)))
+
+
+def _with_page(url: str, page: int) -> str:
+    """Return ``url`` with its ``page`` query parameter set to ``page``."""
+    return with_query(url, page=page)
+
+
+def iter_json_pages(
+    url: str,
+    max_workers: int = 1,
+    projection: Projection = None,
+) -> Iterator[Any]:
+    """Lazily yield each page of a paginated JSON resource.
+    Pages are requested one at a time by following the ``rel="next"``
+    entry of the Link header, so nothing past the page being consumed is
+    fetched or held in memory.
+    With ``max_workers`` above one and a ``rel="last"`` link on the first
+    response, the remaining pages are fetched concurrently by that many
+    threads instead; they are still yielded in page order.
+    Parameters
+    ----------
+    url: str
+        URL of the first page
+    max_workers: int
+        number of pages fetched at once after the first one
+    projection: Iterable
+        key paths kept from each page, see `fetch_json`
+    Example
+    -------
+    >>> for page in iter_json_pages("https://api.github.com/orgs/x/repos"):
+    ...     print(len(page))
+    30
+    12
+    """
+    response = fetch_json(url, projection)
+    yield response.payload
+    last_url = response.links.get("last", {}).get("url")
+    next_url = response.links.get("next", {}).get("url")
+    first = _page_number(next_url) if next_url else None
+    last = _page_number(last_url) if last_url else None
+    if max_workers > 1 and first is not None and last is not None:
+        urls = [_with_page(last_url, page) for page in range(first, last + 1)]
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(urls)))
+        context = contextvars.copy_context()
+        try:
+            for payload in executor.map(
+                    lambda page_url: context.copy().run(
+                        get_json, page_url, projection=projection), urls):
+                yield payload
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return
+    while next_url:
+        response = fetch_json(next_url, projection)
+        yield response.payload
+        next_url = response.links.get("next", {}).get("url")
+
+
+def _iter_body(response: requests.Response,
+               sizes: List[int]) -> Iterator[bytes]:
+    """Yield the decoded body of a streamed ``response``.
+    The raw bytes are read undecoded and inflated here, so ``sizes[0]``
+    counts them as transferred and ``sizes[1]`` once decoded, whatever
+    the transfer framing (``raw.tell()`` misses chunked bodies).
+    """
+    coding = response.headers.get("Content-Encoding", "").strip().lower()
+    decoder = zlib.decompressobj(32 + zlib.MAX_WBITS) \
+        if coding in _ZLIB_CODINGS else None
+    try:
+        for chunk in response.raw.stream(STREAM_CHUNK_SIZE,
+                                         decode_content=False):
+            sizes[0] += len(chunk)
+            if decoder is not None:
+                chunk = decoder.decompress(chunk)
+            if chunk:
+                sizes[1] += len(chunk)
+                yield chunk
+        chunk = decoder.flush() if decoder is not None else b""
+    except ProtocolError as error:
+        raise requests.exceptions.ChunkedEncodingError(error) from error
+    except ReadTimeoutError as error:
+        raise requests.exceptions.ConnectionError(error) from error
+    except zlib.error as error:
+        raise requests.exceptions.ContentDecodingError(error) from error
+    if chunk:
+        sizes[1] += len(chunk)
+        yield chunk
+
+
+def iter_json_items(
+    url: str,
+    projection: Projection = None,
+) -> Iterator[Any]:
+    """Stream the elements of a paginated JSON array resource.
+    Each page is read from the socket in `STREAM_CHUNK_SIZE` chunks and
+    decoded with `iter_json_array`, so elements are yielded while the
+    page is still downloading; the ``rel="next"`` page is requested once
+    the current one is exhausted. Compressed pages are inflated chunk by
+    chunk as they arrive.
+    Pages go through the same caches as `fetch_json`: live `DiskCache`
+    entries are replayed without a request, the validators in
+    `validator_cache` are sent and the cached elements replayed on
+    ``304 Not Modified``, and a page read to the end is stored in both.
+    Concurrent streams of the same page share one request: the first
+    one streams it and the others replay its elements once it is done,
+    so a stream must be read to the end or closed.
+    Parameters
+    ----------
+    url: str
+        URL of the first page
+    projection: Iterable
+        key paths kept from each element, see `project`
+    """
+    tree = None if projection is None else _projection_tree(projection)
+    while url:
+        page = yield from _stream_page(url, _cache_key(url, tree),
+                                       projection)
+        url = page.links.get("next", {}).get("url")
+
+
+def _stream_page(url: str, key: str,
+                 projection: Projection) -> Iterator[Any]:
+    """Yield the elements of one page of `iter_json_items`, returning its
+    `JSONResponse`.
+    """
+    disk_cache = _disk_cache
+    if disk_cache is not None:
+        stored = disk_cache.get(key)
+        if stored is not None:
+            yield from stored.payload
+            return stored
+    result, streamed = yield from request_coalescer.stream(
+        key, partial(_download_page, url, key, projection))
+    if not streamed:
+        yield from result.payload
+    return result
+
+
+def _download_page(url: str, key: str,
+                   projection: Projection) -> Iterator[Any]:
+    """Uncoalesced body of `_stream_page`."""
+    cached = validator_cache.get(key)
+    with _send(url, ValidatorCache.conditional_headers(cached),
+               stream=True) as response:
+        if cached is not None and response.status_code == 304:
+            result = cached.response._replace(wire_bytes=0, body_bytes=0)
+            yield from result.payload
+        else:
+            sizes = [0, 0]
+            items = []
+            try:
+                for item in iter_json_array(_iter_body(response, sizes),
+                                            projection):
+                    items.append(item)
+                    yield item
+            finally:
+                _transfer_stats.record(*sizes)
+            result = JSONResponse(items, response.links, *sizes)
+            _remember_validators(key, response.status_code,
+                                 response.headers, result)
+    disk_cache = _disk_cache
+    if disk_cache is not None and response.status_code in (200, 304):
+        disk_cache.put(key, result)
+    return result
+
+
+_async_sessions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_async_session() -> "aiohttp.ClientSession":
+    """Return the pooled aiohttp session of the running event loop.
+    Each loop gets its own session, created on first use; close it with
+    `close_async_session` before the loop shuts down.
+    """
+    if aiohttp is None:
+        raise RuntimeError("the async helpers require aiohttp")
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=DEFAULT_ASYNC_CONNECTIONS),
+        )
+        _async_sessions[loop] = session
+    return session
+
+
+async def close_async_session() -> None:
+    """Close the running loop's session, if one was opened."""
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+async def _send_async(url: str,
+                      headers: Dict[str, str]) -> "aiohttp.ClientResponse":
+    """Async counterpart of `_send`."""
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        await rate_limiter.acquire_async(_priority.get())
+        try:
+            response = await get_async_session().get(url, headers=headers)
+        except BaseException:
+            rate_limiter.release()
+            raise
+        limited = rate_limiter.release(response.status, response.headers)
+        if not limited or attempt == RATE_LIMIT_RETRIES:
+            return response
+        response.release()
+
+
+async def fetch_json_async(url: str,
+                           projection: Projection = None) -> JSONResponse:
+    """Non-blocking counterpart of `fetch_json`.
+    Shares `validator_cache` and the disk cache (see
+    `configure_disk_cache`) with the blocking path, so a body fetched by
+    either one is served or revalidated rather than downloaded again,
+    and joins any request for the same URL and ``projection`` already in
+    flight from a thread or a task.
+    """
+    tree = None if projection is None else _projection_tree(projection)
+    key = _cache_key(url, tree)
+    return await request_coalescer.run_async(
+        key, partial(_fetch_json_async, url, key, tree))
+
+
+async def _fetch_json_async(url: str, key: str,
+                            tree: Optional[Dict]) -> JSONResponse:
+    """Uncoalesced body of `fetch_json_async`."""
+    disk_cache = _disk_cache
+    if disk_cache is not None:
+        stored = disk_cache.get(key)
+        if stored is not None:
+            return stored
+    cached = validator_cache.get(key)
+    headers = ValidatorCache.conditional_headers(cached)
+    async with await _send_async(url, headers) as response:
+        if cached is not None and response.status == 304:
+            result = cached.response._replace(wire_bytes=0, body_bytes=0)
+        else:
+            content = await response.read()
+            payload = decode_json(content) if tree is None \
+                else _decode_projected(content, tree)
+            wire_bytes = response.content.total_raw_bytes
+            body_bytes = response.content.total_bytes
+            _transfer_stats.record(wire_bytes, body_bytes)
+            links = {
+                str(rel): {name: str(value) for name, value in link.items()}
+                for rel, link in response.links.items()
+            }
+            result = JSONResponse(payload, links, wire_bytes, body_bytes)
+            _remember_validators(key, response.status, response.headers,
+                                 result)
+    if disk_cache is not None and response.status in (200, 304):
+        disk_cache.put(key, result)
+    return result
+
+
+async def get_json_async(url: str, projection: Projection = None) -> Dict:
+    """Get JSON from remote URL without blocking the event loop.
+    """
+    return (await fetch_json_async(url, projection)).payload
+
+
+async def iter_json_pages_async(
+    url: str,
+    projection: Projection = None,
+) -> AsyncIterator[Any]:
+    """Async generator over the pages of a paginated JSON resource,
+    following ``rel="next"`` links like `iter_json_pages`.
+    """
+    while url:
+        response = await fetch_json_async(url, projection)
+        yield response.payload
+        url = response.links.get("next", {}).get("url")
+
+
+class LRUCache:
+    """Thread-safe bounded mapping that evicts the least recently used key.
+    Used as a process-wide backend for `memoize`, so that instances with
+    the same ``_memo_key()`` share computed values.
+    Example
+    -------
+    >>> cache = LRUCache(2)
+    >>> cache.put("a", 1)
+    >>> cache.get("a")
+    1
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MEMO_CACHE_SIZE) -> None:
+        """Create an empty cache holding at most ``maxsize`` keys."""
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Number of cached keys."""
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Whether ``key`` is cached, without marking it used."""
+        return key in self._entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value of ``key`` and mark it recently used."""
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                return default
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store ``value``, evicting the least recently used keys."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove ``key`` and return its value."""
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+
+
+shared_memo_cache = LRUCache()
+
+
+_memoize_locks_guard = threading.Lock()
+
 
+def _instance_lock(obj: Any, lock_name: str) -> threading.RLock:
+    """Return the lock stored on ``obj`` as ``lock_name``, creating it."""
+    lock = getattr(obj, lock_name, None)
+    if lock is None:
+        with _memoize_locks_guard:
+            lock = getattr(obj, lock_name, None)
+            if lock is None:
+                lock = threading.RLock()
+                setattr(obj, lock_name, lock)
+    return lock
 
-def memoize(fn: Callable) -> Callable:
+
+def memoize(
+    fn: Optional[Callable] = None,
+    *,
+    ttl: Union[float, Callable[[Any], Optional[float]], None] = None,
+) -> Callable:
     """Decorator to memoize a method.
+    The first access computes the value under a per-instance lock, so
+    threads racing on a cold property wait for that single computation
+    and share its result instead of each running ``fn``. Once stored,
+    reads only check the instance attribute and take no lock.
+    With ``ttl`` (seconds, or a function of the instance returning
+    seconds or None) the value expires: the first read after expiry
+    still returns the stale value immediately and starts one background
+    thread to recompute it. Use `invalidate_memoized` to drop values.
+    Instances whose class (or themselves) set ``memo_backend`` to an
+    `LRUCache` and define ``_memo_key()`` also share values through that
+    cache, keyed by class, property name and ``_memo_key()``: a fresh
+    instance with the same key reuses what another one computed, and
+    instances already holding a value pick up the one last stored by
+    any of them (see `update_memoized`).
     Example
     -------
     class MyClass:
@@ -56,6 +1728,10 @@ def memoize(fn: Callable) -> Callable:
         def a_method(self):
             print("a_method called")
             return 42
+
+        @memoize(ttl=60)
+        def fresh_method(self):
+            return time.time()
     >>> my_object = MyClass()
     >>> my_object.a_method
     a_method called
@@ -63,13 +1739,212 @@ def memoize(fn: Callable) -> Callable:
     >>> my_object.a_method
     42
     """
+    if fn is None:
+        return partial(memoize, ttl=ttl)
     attr_name = "_{}".format(fn.__name__)
+    lock_name = "_{}_lock".format(fn.__name__)
+    expires_name = "_{}_expires".format(fn.__name__)
+    refreshing_name = "_{}_refreshing".format(fn.__name__)
+    generation_name = "_{}_generation".format(fn.__name__)
+
+    def backend_key(self):
+        """Shared backend and key of the value, or (None, None)."""
+        backend = getattr(self, "memo_backend", None)
+        if backend is None:
+            return None, None
+        return backend, (type(self), fn.__name__, self._memo_key())
+
+    def store(self, value, expires=None):
+        """Set the value and, with a ttl, its expiry."""
+        if expires is None:
+            seconds = ttl(self) if callable(ttl) else ttl
+            if seconds is not None:
+                expires = time.monotonic() + seconds
+        if expires is not None:
+            setattr(self, expires_name, expires)
+        setattr(self, attr_name, value)
+        backend, key = backend_key(self)
+        if backend is not None:
+            backend.put(key, (value, expires))
+
+    def load(self):
+        """Compute the value, or adopt the one in the shared backend."""
+        backend, key = backend_key(self)
+        shared = None if backend is None else backend.get(key)
+        if shared is None or \
+                shared[1] is not None and time.monotonic() >= shared[1]:
+            store(self, fn(self))
+        else:
+            value, expires = shared
+            if expires is not None:
+                setattr(self, expires_name, expires)
+            setattr(self, attr_name, value)
+
+    def adopt(self, backend, key):
+        """Take the value last stored in the backend, if it changed."""
+        shared = backend.get(key)
+        if shared is not None and \
+                shared[0] is not getattr(self, attr_name, None):
+            with _instance_lock(self, lock_name):
+                if shared[1] is not None:
+                    setattr(self, expires_name, shared[1])
+                setattr(self, attr_name, shared[0])
+
+    def update(self, value):
+        """Store ``value`` as freshly computed, superseding refreshes."""
+        with _instance_lock(self, lock_name):
+            store(self, value)
+            setattr(self, generation_name,
+                    getattr(self, generation_name, 0) + 1)
+
+    def refresh(self, generation):
+        """Recompute an expired value off the reading thread."""
+        try:
+            value = fn(self)
+        except Exception:
+            failed = True
+        else:
+            failed = False
+        with _instance_lock(self, lock_name):
+            if not failed and \
+                    getattr(self, generation_name, 0) == generation:
+                store(self, value)
+            setattr(self, refreshing_name, False)
+
+    def invalidate(self):
+        """Drop the stored value so the next read recomputes it."""
+        with _instance_lock(self, lock_name):
+            for name in (attr_name, expires_name):
+                if hasattr(self, name):
+                    delattr(self, name)
+            backend, key = backend_key(self)
+            if backend is not None:
+                backend.pop(key)
+            setattr(self, generation_name,
+                    getattr(self, generation_name, 0) + 1)
 
     @wraps(fn)
     def memoized(self):
         """"memoized wraps"""
-        if not hasattr(self, attr_name):
-            setattr(self, attr_name, fn(self))
-        return getattr(self, attr_name)
+        if hasattr(self, attr_name):
+            backend, key = backend_key(self)
+            if backend is not None:
+                adopt(self, backend, key)
+            expires = getattr(self, expires_name, None)
+            if expires is None or time.monotonic() < expires:
+                return getattr(self, attr_name)
+            with _instance_lock(self, lock_name):
+                if hasattr(self, attr_name):
+                    if not getattr(self, refreshing_name, False):
+                        setattr(self, refreshing_name, True)
+                        threading.Thread(
+                            target=refresh,
+                            args=(self, getattr(self, generation_name, 0)),
+                            daemon=True,
+                        ).start()
+                    return getattr(self, attr_name)
+        with _instance_lock(self, lock_name):
+            if not hasattr(self, attr_name):
+                load(self)
+            return getattr(self, attr_name)
+
+    memoized.invalidate = invalidate
+    memoized.update = update
+    return property(memoized)
+
+
+def _memoized_properties(obj: Any) -> Dict[str, Callable]:
+    """The `memoize` wrappers of ``obj``'s class by property name."""
+    found = {}
+    for klass in reversed(type(obj).__mro__):
+        for name, attr in vars(klass).items():
+            if isinstance(attr, property) and \
+                    hasattr(attr.fget, "invalidate"):
+                found[name] = attr.fget
+            elif name in found:
+                del found[name]
+    return found
+
+
+def _memoized_property(obj: Any, name: str) -> Callable:
+    """The `memoize` wrapper of property ``name`` of ``obj``."""
+    try:
+        return _memoized_properties(obj)[name]
+    except KeyError:
+        raise AttributeError(
+            "{!r} is not a memoized property of {}".format(
+                name, type(obj).__name__)) from None
+
+
+def invalidate_memoized(obj: Any, *names: str) -> None:
+    """Forget memoized values of ``obj`` so they are recomputed.
+    Parameters
+    ----------
+    obj: Any
+        instance holding the memoized values
+    names: str
+        property names to drop; every memoized property when omitted
+    Example
+    -------
+    >>> invalidate_memoized(client, "repos_payload")
+    >>> invalidate_memoized(client)
+    """
+    if names:
+        for memoized in [_memoized_property(obj, name) for name in names]:
+            memoized.invalidate(obj)
+    else:
+        for memoized in _memoized_properties(obj).values():
+            memoized.invalidate(obj)
+
+
+def update_memoized(obj: Any, name: str, value: Any) -> None:
+    """Replace the memoized value ``name`` of ``obj`` by ``value``.
+    The value gets a new expiry, is written to the shared backend if
+    there is one, and wins over a background refresh already running.
+    Example
+    -------
+    >>> update_memoized(client, "repos_payload", repos)
+    """
+    _memoized_property(obj, name).update(obj, value)
+
+
+def async_memoize(fn: Callable[[Any], Awaitable]) -> Callable:
+    """Decorator to memoize a coroutine method.
+    Like `memoize` the result is stored on the instance as ``_<name>``.
+    Concurrent first calls share a single in-flight task; if it fails
+    nothing is stored and the next call tries again.
+    Example
+    -------
+    class MyClass:
+        @async_memoize
+        async def a_method(self):
+            print("a_method called")
+            return 42
+    >>> my_object = MyClass()
+    >>> await my_object.a_method()
+    a_method called
+    42
+    >>> await my_object.a_method()
+    42
+    """
+    attr_name = "_{}".format(fn.__name__)
+    task_name = "_{}_task".format(fn.__name__)
+
+    @wraps(fn)
+    async def memoized(self):
+        """memoized wraps"""
+        if hasattr(self, attr_name):
+            return getattr(self, attr_name)
+        task = getattr(self, task_name, None)
+        if task is None:
+            task = asyncio.ensure_future(fn(self))
+            setattr(self, task_name, task)
+        try:
+            value = await asyncio.shield(task)
+        finally:
+            if task.done() and getattr(self, task_name, None) is task:
+                delattr(self, task_name)
+        setattr(self, attr_name, value)
+        return value
 
-    return property(memoized)
\ No newline at end of file
+    return memoized
\ No newline at end of file